@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .results import read_chunks, read_columns, read_metadata, read_participants, result_paths
+
+DAY = pd.Timedelta(days=1).value
+DAYS = 28
+
+
+def _reach_counts(sources, fastest, num_sources, days):
+    # Targets reached per source and day since the fastest arrival at its closest target, i.e., the daily bins
+    # of the notebook's resample with offset=-group.min(); later days do not contribute to the first days
+    if len(sources) and np.any(np.diff(sources) < 0):
+        order = np.argsort(sources, kind='stable')
+        sources, fastest = sources[order], fastest[order]
+    if len(sources) == 0:
+        return np.zeros((num_sources, days + 1), dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(sources)) + 1))
+    first = np.minimum.reduceat(fastest, starts)
+    day = (fastest - np.repeat(first, np.diff(np.append(starts, len(sources))))) // DAY
+    within = day <= days
+    return np.bincount(sources[within] * (days + 1) + day[within], minlength=num_sources * (days + 1)).reshape(num_sources, days + 1)
+
+
+def _to_frame(counts, participants, days):
+    index = pd.timedelta_range(start=timedelta(0), end=timedelta(days=days), freq='D')
+    return pd.DataFrame(counts.cumsum(axis=1).T, index=index, columns=participants)
+
+
+def cumulative_reach(result, days=DAYS):
+    # Number of participants each source has reached by each day since its fastest arrival, with sources in
+    # columns, as computed by compute(df) in notebooks/plot.ipynb
+    sources = result.index.get_level_values(0)
+    fastest = result.fastest.to_numpy(dtype='timedelta64[ns]').view(np.int64)
+    counts = _reach_counts(np.asarray(sources.codes, dtype=np.int64), fastest, len(sources.categories), days)
+    return _to_frame(counts, sources.categories, days)
+
+
+def cumulative_reach_from_chunks(path, days=DAYS):
+    # Same as cumulative_reach(to_frame(path)), but streams the chunks of a result, which hold whole sources;
+    # results with deltas are read at once, as their rows are resolved across all chunks
+    if not read_metadata(path)['datetimes']:
+        raise ValueError(f'{path} has no datetime timings to bin into days')
+    if len(result_paths(path)) > 1:
+        participants, columns = read_columns(path)
+        chunks = [columns]
+    else:
+        participants, chunks = read_participants(path), read_chunks(path)
+    counts = np.zeros((len(participants), days + 1), dtype=np.int64)
+    for chunk in chunks:
+        counts += _reach_counts(chunk['source'].astype(np.int64), chunk['fastest'], len(participants), days)
+    return _to_frame(counts, pd.Index(tuple(participants)), days)
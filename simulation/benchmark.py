@@ -0,0 +1,139 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from .model import CommunicationNetwork
+from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, single_source_bellman_ford_hypergraph, single_source_all_distances, DistanceType
+from .run import run_simulation
+from .streaming import read_network
+from .synthetic import synthetic_network
+
+HISTORY_PATH = Path('./benchmarks/history.json')
+THRESHOLD = 1.25
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def simulation_slice(tmp_dir, num_sources, num_processes):
+    # End-to-end run of a sample of sources on the synthetic network, which poses as the published one; the first
+    # run includes the conversion into the columnar format
+    with working_directory(tmp_dir), patch.object(sys, 'argv', ['run', '--sample', str(num_sources), '--num_processes', str(num_processes), '--no_export']), contextlib.redirect_stdout(io.StringIO()):
+        run_simulation()
+
+
+def benchmarks(tmp_dir, num_channels, seed, num_sources, num_processes):
+    # Named functions to time; networks and files are set up before, and the sources are the same for all engines
+    network = synthetic_network(num_channels, seed=seed)
+    frozen = network.freeze()
+    sources = random.Random(seed).sample(sorted(frozen.participants()), min(num_sources, len(frozen.participants())))
+    json_path = Path(tmp_dir) / 'data' / 'networks' / 'microsoft.json.bz2'
+    json_path.parent.mkdir(parents=True)
+    network.to_json(json_path)
+
+    yield 'from_json', lambda: CommunicationNetwork.from_json(json_path)
+    yield 'read_network', lambda: read_network(json_path, num_processes=num_processes)
+    for distance_type in DistanceType:
+        yield f'single_source_dijkstra_hyperedges[{distance_type.name.lower()}]', lambda distance_type=distance_type: [single_source_dijkstra_hyperedges(frozen, source, distance_type) for source in sources]
+        yield f'single_source_dijkstra_vertices[{distance_type.name.lower()}]', lambda distance_type=distance_type: [single_source_dijkstra_vertices(frozen, source, distance_type) for source in sources]
+        yield f'single_source_bellman_ford_hypergraph[{distance_type.name.lower()}]', lambda distance_type=distance_type: [single_source_bellman_ford_hypergraph(frozen, source, distance_type) for source in sources]
+    yield 'single_source_all_distances', lambda: [single_source_all_distances(frozen, source) for source in sources]
+    yield 'run_simulation[sample]', lambda: simulation_slice(tmp_dir, num_sources, num_processes)
+
+
+def run_benchmarks(num_channels=10000, seed=0, num_sources=10, num_processes=2, repeat=3, select=None):  # pylint: disable=too-many-arguments
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, function in benchmarks(tmp_dir, num_channels, seed, num_sources, num_processes):
+            if select is None or any(pattern in name for pattern in select):
+                results[name] = timed(function, repeat)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path):
+    path = Path(path)
+    return json.loads(path.read_text(encoding='utf-8')) if path.exists() else []
+
+
+def append_history(path, entry):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(read_history(path) + [entry], indent=1), encoding='utf-8')
+
+
+def compare(entry, history, threshold=THRESHOLD):
+    # Ratio of each minimum time to the one of the latest earlier run with the same parameters on the same machine;
+    # ratios above the threshold are regressions
+    previous = next((run for run in reversed(history) if run['parameters'] == entry['parameters'] and run['machine'] == entry['machine']), None)
+    comparison = {}
+    for name, result in entry['results'].items():
+        baseline = previous['results'].get(name) if previous else None
+        ratio = result['min'] / baseline['min'] if baseline and baseline['min'] > 0 else None
+        comparison[name] = (result['min'], result['median'], ratio, ratio is not None and ratio > threshold)
+    return previous, comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the engines on a synthetic code review network and keep a history of the results')
+    parser.add_argument('--channels', type=int, default=10000, help='Number of channels of the synthetic network (default 10000)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic network and the sources (default 0)')
+    parser.add_argument('--sources', type=int, default=10, help='Number of sources per single-source benchmark and of the simulated sample (default 10)')
+    parser.add_argument('--num_processes', type=int, default=2, help='Number of parallel processes of the simulation (default 2)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of repetitions of each benchmark (default 3)')
+    parser.add_argument('--select', type=str, nargs='+', help='Only run the benchmarks whose names contain one of these strings')
+    parser.add_argument('--history', type=Path, default=HISTORY_PATH, help=f'JSON file of the history of results (default {HISTORY_PATH})')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help=f'Slowdown relative to the previous run flagged as a regression (default {THRESHOLD})')
+    args = parser.parse_args()
+
+    parameters = {'channels': args.channels, 'seed': args.seed, 'sources': args.sources, 'num_processes': args.num_processes}
+    results = run_benchmarks(args.channels, args.seed, args.sources, args.num_processes, args.repeat, args.select)
+    entry = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(), 'machine': platform.node(),
+             'python': platform.python_version(), 'numpy': np.__version__, 'parameters': parameters, 'results': results}
+    previous, comparison = compare(entry, read_history(args.history), args.threshold)
+    print(f'Compared to {previous["commit"]} of {previous["timestamp"]}' if previous else 'No previous run with these parameters')
+    for name, (minimum, median, ratio, regression) in comparison.items():
+        print(f'{name:<50} {minimum:>10.4f} s min {median:>10.4f} s median' + ('' if ratio is None else f' {ratio:>6.2f}x') + (' REGRESSION' if regression else ''))
+    append_history(args.history, entry)
+    if any(regression for *_, regression in comparison.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
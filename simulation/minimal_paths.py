@@ -1,8 +1,34 @@
 import heapq
+from bisect import bisect_left, bisect_right
 from enum import Enum
-from datetime import datetime
+from itertools import groupby
+import warnings
 
-from .model import TimeVaryingHypergraph
+import numpy as np
+
+from .model import TimeVaryingHypergraph, FrozenTimeVaryingHypergraph, SuccessorDag, to_epoch
+
+
+# Work of the single-source engines, summed over calls until taken: heap pushes and pops, pops of outdated
+# entries, label relaxations, and incidences (hyperedge-vertex pairs) scanned. The engines count in locals and add
+# them up once per call, so the counters are always on.
+COUNTERS = ('pushes', 'pops', 'stale_pops', 'relaxations', 'scanned')
+_counters = dict.fromkeys(COUNTERS, 0)
+
+
+def _count(pushes=0, pops=0, stale_pops=0, relaxations=0, scanned=0):
+    _counters['pushes'] += pushes
+    _counters['pops'] += pops
+    _counters['stale_pops'] += stale_pops
+    _counters['relaxations'] += relaxations
+    _counters['scanned'] += scanned
+
+
+def take_counters():
+    # The counters since the last call, e.g. of one source
+    counters = dict(_counters)
+    _counters.update(dict.fromkeys(COUNTERS, 0))
+    return counters
 
 
 class DistanceType(Enum):
@@ -11,141 +37,595 @@ class DistanceType(Enum):
     FOREMOST = 2
 
 
-def single_source_dijkstra_hyperedges(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
+def _warn_min_timing(min_timing):
+    # The engines handle timings as epochs of the frozen hypergraph and search all of its hyperedges, so the
+    # former lower bound of the timings has no effect
+    if min_timing is not None:
+        warnings.warn('min_timing has no effect and will be removed; timings are handled as epochs of the frozen hypergraph', DeprecationWarning, stacklevel=3)
+
+
+def _to_output(hypergraph: FrozenTimeVaryingHypergraph, distances: dict, distance_type: DistanceType):
+    vertex_names = hypergraph.vertex_names
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return {vertex_names[vertex]: distance for vertex, distance in distances.items()}
+        case DistanceType.FASTEST:
+            return {vertex_names[vertex]: hypergraph.to_duration(distance) for vertex, distance in distances.items()}
+        case DistanceType.FOREMOST:
+            return {vertex_names[vertex]: hypergraph.to_timing(distance) for vertex, distance in distances.items()}
+
+
+def single_source_dijkstra_hyperedges(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=None):  # pylint: disable=too-many-branches
+    _warn_min_timing(min_timing)
+    distance_type = DistanceType(distance_type)
+    hypergraph = hypergraph.freeze()
+    hedge_vertices, vertex_hedges, timings, vertex_timings = hypergraph.adjacency()
+    source = hypergraph.vertex_id(source_vertex)
+
     hedge_distances: dict = {}
     queue: list = []
+    pops = stale_pops = relaxations = scanned = 0
 
-    for source_hedge in hypergraph.hyperedges(source_vertex):
+    for source_hedge in vertex_hedges[source]:
         match distance_type:
             case DistanceType.SHORTEST:
                 init_value = 1
             case DistanceType.FASTEST:
-                init_value = min_timing - min_timing
+                init_value = 0
             case DistanceType.FOREMOST:
-                init_value = hypergraph.timings(source_hedge)
+                init_value = timings[source_hedge]
         heapq.heappush(queue, (init_value, source_hedge))
         hedge_distances[source_hedge] = init_value
 
     while queue:
         prior_distance, source_hedge = heapq.heappop(queue)
-        source_hedge_timing = hypergraph.timings(source_hedge)
-        for vertex in hypergraph.vertices(source_hedge):
-            for next_hedge in hypergraph.hyperedges(vertex):
-                next_hedge_timing = hypergraph.timings(next_hedge)
-                if source_hedge_timing < next_hedge_timing:
-                    match distance_type:
-                        case DistanceType.SHORTEST:
-                            new_distance = prior_distance + 1
-                        case DistanceType.FASTEST:
-                            new_distance = prior_distance + (next_hedge_timing - source_hedge_timing)
-                        case DistanceType.FOREMOST:
-                            new_distance = next_hedge_timing
-                    if next_hedge not in hedge_distances or new_distance < hedge_distances[next_hedge]:
-                        hedge_distances[next_hedge] = new_distance
-                        heapq.heappush(queue, (new_distance, next_hedge))
+        pops += 1
+        if prior_distance > hedge_distances[source_hedge]:
+            stale_pops += 1
+            continue
+        source_hedge_timing = timings[source_hedge]
+        for vertex in hedge_vertices[source_hedge]:
+            # hyperedges per vertex are sorted by timing, so only the strictly later suffix is visited
+            next_hedges = vertex_hedges[vertex][bisect_right(vertex_timings[vertex], source_hedge_timing):]
+            scanned += len(next_hedges)
+            for next_hedge in next_hedges:
+                next_hedge_timing = timings[next_hedge]
+                match distance_type:
+                    case DistanceType.SHORTEST:
+                        new_distance = prior_distance + 1
+                    case DistanceType.FASTEST:
+                        new_distance = prior_distance + (next_hedge_timing - source_hedge_timing)
+                    case DistanceType.FOREMOST:
+                        new_distance = next_hedge_timing
+                if next_hedge not in hedge_distances or new_distance < hedge_distances[next_hedge]:
+                    hedge_distances[next_hedge] = new_distance
+                    heapq.heappush(queue, (new_distance, next_hedge))
+                    relaxations += 1
+    _count(pushes=len(vertex_hedges[source]) + relaxations, pops=pops, stale_pops=stale_pops, relaxations=relaxations, scanned=scanned)
 
     vertex_distances: dict = {}
     for source_hedge, distance in hedge_distances.items():
-        for vertex in hypergraph.vertices(source_hedge):
+        for vertex in hedge_vertices[source_hedge]:
             if vertex not in vertex_distances or distance < vertex_distances[vertex]:
                 vertex_distances[vertex] = distance
-    vertex_distances.pop(source_vertex)
-    return vertex_distances
+    vertex_distances.pop(source, None)
+    return _to_output(hypergraph, vertex_distances, distance_type)
+
 
+def single_source_dijkstra_vertices(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=None):  # pylint: disable=too-many-branches
+    _warn_min_timing(min_timing)
+    distance_type = DistanceType(distance_type)
+    hypergraph = hypergraph.freeze()
+    hedge_vertices, vertex_hedges, timings, vertex_timings = hypergraph.adjacency()
+    source = hypergraph.vertex_id(source_vertex)
 
-def single_source_dijkstra_vertices(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
     distances: dict = {}
     queue: list = []
 
     source_hedge = None
-    source_reachable = (source_vertex, source_hedge)
+    source_reachable = (source, source_hedge)
 
-    match distance_type:
-        case DistanceType.SHORTEST:
-            init_distance = 0
-        case DistanceType.FASTEST:
-            init_distance = min_timing - min_timing
-        case DistanceType.FOREMOST:
-            init_distance = min_timing
+    init_distance = 0  # the source itself is dropped from the result, whatever its distance
 
     distances[source_reachable] = init_distance
     heapq.heappush(queue, (init_distance, source_reachable))
+    pops = stale_pops = relaxations = scanned = 0
 
     while queue:
         distance, (vertex, source_hedge) = heapq.heappop(queue)
-        for next_hedge in hypergraph.hyperedges(vertex):
-            if source_hedge:
-                source_hedge_timing = hypergraph.timings(source_hedge)
-            else:  # damn source_hedge
-                source_hedge_timing = hypergraph.timings(next_hedge)
-            next_hedge_timing = hypergraph.timings(next_hedge)
-            if not source_hedge or source_hedge_timing < next_hedge_timing:
-                for next_vertex in hypergraph.vertices(next_hedge):
-                    new_reachable = (next_vertex, next_hedge)
-                    match distance_type:
-                        case DistanceType.SHORTEST:
-                            new_distance = distance + 1
-                        case DistanceType.FASTEST:
-                            new_distance = distance + (next_hedge_timing - source_hedge_timing)
-                        case DistanceType.FOREMOST:
-                            new_distance = next_hedge_timing
-                    if new_reachable not in distances or new_distance < distances[new_reachable]:
-                        distances[new_reachable] = new_distance
-                        heapq.heappush(queue, (new_distance, new_reachable))
+        pops += 1
+        if distance > distances[(vertex, source_hedge)]:
+            stale_pops += 1
+            continue
+        if source_hedge is None:
+            next_hedges = vertex_hedges[vertex]
+        else:
+            source_hedge_timing = timings[source_hedge]
+            next_hedges = vertex_hedges[vertex][bisect_right(vertex_timings[vertex], source_hedge_timing):]
+        for next_hedge in next_hedges:
+            next_hedge_timing = timings[next_hedge]
+            if source_hedge is None:
+                source_hedge_timing = next_hedge_timing
+            scanned += len(hedge_vertices[next_hedge])
+            for next_vertex in hedge_vertices[next_hedge]:
+                new_reachable = (next_vertex, next_hedge)
+                match distance_type:
+                    case DistanceType.SHORTEST:
+                        new_distance = distance + 1
+                    case DistanceType.FASTEST:
+                        new_distance = distance + (next_hedge_timing - source_hedge_timing)
+                    case DistanceType.FOREMOST:
+                        new_distance = next_hedge_timing
+                if new_reachable not in distances or new_distance < distances[new_reachable]:
+                    distances[new_reachable] = new_distance
+                    heapq.heappush(queue, (new_distance, new_reachable))
+                    relaxations += 1
+    _count(pushes=1 + relaxations, pops=pops, stale_pops=stale_pops, relaxations=relaxations, scanned=scanned)
     minimal_distances: dict = {}
     for (vertex, _), distance in distances.items():
         if vertex not in minimal_distances or distance < minimal_distances[vertex]:
             minimal_distances[vertex] = distance
-    minimal_distances.pop(source_vertex)
+    minimal_distances.pop(source)
 
-    return minimal_distances
+    return _to_output(hypergraph, minimal_distances, distance_type)
 
-def single_source_bellman_ford_hypergraph(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
-    vertices = hypergraph.vertices()
-    hedges = hypergraph.hyperedges()
+def single_source_bellman_ford_hypergraph(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=None):  # pylint: disable=too-many-locals,too-many-branches
+    # Label-correcting passes over the time-sorted hyperedges until no label changes. The label of a hyperedge
+    # is relaxed in O(k) from the best labels of its vertices among strictly earlier hyperedges, which are
+    # aggregated per vertex while a pass walks the stream; thus the first pass settles all labels and the second
+    # only confirms them. Labels are hops for shortest, the latest start for fastest, and reachability for foremost.
+    _warn_min_timing(min_timing)
+    distance_type = DistanceType(distance_type)
+    hypergraph = hypergraph.freeze()
+    hedge_vertices, _, timings, _ = hypergraph.adjacency()
+    source = hypergraph.vertex_id(source_vertex)
 
-    distances: dict = {vertex: float('inf') for vertex in vertices}
-    predecessor: dict = {vertex: None for vertex in vertices}
+    chronological_order = sorted(range(len(timings)), key=timings.__getitem__)
+    groups = [list(group) for _, group in groupby(chronological_order, key=timings.__getitem__)]
+    labels: dict = {}
+    relaxations = scanned = 0
+    while True:
+        changed = False
+        vertex_labels: dict = {}
+        for group in groups:
+            # hyperedges sharing a timing do not relax each other, so they all read the state before the group
+            for hedge in group:
+                scanned += len(hedge_vertices[hedge])
+                relaxed = [vertex_labels[vertex] for vertex in hedge_vertices[hedge] if vertex in vertex_labels]
+                match distance_type:
+                    case DistanceType.SHORTEST:
+                        label = 1 if source in hedge_vertices[hedge] else min(relaxed) + 1 if relaxed else None
+                    case DistanceType.FASTEST:
+                        label = timings[hedge] if source in hedge_vertices[hedge] else max(relaxed) if relaxed else None
+                    case DistanceType.FOREMOST:
+                        label = True if source in hedge_vertices[hedge] or relaxed else None
+                if label is not None and (hedge not in labels or (label > labels[hedge] if distance_type is DistanceType.FASTEST else label < labels[hedge])):
+                    labels[hedge] = label
+                    changed = True
+                    relaxations += 1
+            for hedge in group:
+                if hedge not in labels:
+                    continue
+                for vertex in hedge_vertices[hedge]:
+                    if vertex not in vertex_labels:
+                        vertex_labels[vertex] = labels[hedge]
+                    elif distance_type is DistanceType.FASTEST:
+                        vertex_labels[vertex] = max(vertex_labels[vertex], labels[hedge])
+                    else:
+                        vertex_labels[vertex] = min(vertex_labels[vertex], labels[hedge])
+        if not changed:
+            break
+    _count(relaxations=relaxations, scanned=scanned)
 
-    match distance_type:
-        case DistanceType.SHORTEST:
-            distances[source_vertex] = 0
-        case DistanceType.FASTEST:
-            distances[source_vertex] = min_timing - min_timing
-        case DistanceType.FOREMOST:
-            distances[source_vertex] = min_timing
-
-    for _ in range(len(vertices) - 1):
-        for hedge in hedges:
-            vertex_set = hypergraph.vertices(hedge)
-            weight = hypergraph.timings(hedge)
-            for vertex in vertex_set:
-                for neighbour in vertex_set:
-                    if vertex != neighbour:
-                        match distance_type:
-                            case DistanceType.SHORTEST:
-                                new_distance = distances[vertex] + 1
-                            case DistanceType.FASTEST:
-                                new_distance = distances[vertex] + (weight - distances[vertex])
-                            case DistanceType.FOREMOST:
-                                new_distance = weight
-                        if new_distance < distances[neighbour]:
-                            distances[neighbour] = new_distance
-                            predecessor[neighbour] = vertex
-
-    # Checking for negative cycles:
-    for hedge in hedges:
-        vertex_set = hypergraph.vertices(hedge)
-        weight = hypergraph.timings(hedge)
-        for vertex in vertex_set:
-            for neighbour in vertex_set:
-                if vertex != neighbour:
-                    assert distances[neighbour] <= distances[vertex] + weight, "Hypergraph contains a negative-weight cycle"
+    vertex_distances: dict = {}
+    for hedge, label in labels.items():
+        match distance_type:
+            case DistanceType.SHORTEST:
+                distance = label
+            case DistanceType.FASTEST:
+                distance = timings[hedge] - label
+            case DistanceType.FOREMOST:
+                distance = timings[hedge]
+        for vertex in hedge_vertices[hedge]:
+            if vertex not in vertex_distances or distance < vertex_distances[vertex]:
+                vertex_distances[vertex] = distance
+    vertex_distances.pop(source, None)
+    return _to_output(hypergraph, vertex_distances, distance_type)
+
+
+def _set_source_bits(bitsets, sources):
+    bits = np.arange(len(sources))
+    bitsets[sources, bits // 8] |= np.left_shift(1, bits % 8).astype(np.uint8)
+
+
+def _unpack_source_bits(bitsets):
+    return np.nonzero(np.unpackbits(bitsets, axis=-1, bitorder='little'))
+
+
+def _group_by_source(sources, targets, bits, values):
+    if not targets:
+        return {source: {} for source in sources.tolist()}
+    targets, bits = np.concatenate(targets), np.concatenate(bits)
+    by_source = np.argsort(bits, kind='stable')
+    targets, bits, values = targets[by_source].tolist(), bits[by_source], values[by_source].tolist()
+    bounds = np.searchsorted(bits, np.arange(len(sources) + 1)).tolist()
+    return {source: dict(zip(targets[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]])) for i, source in enumerate(sources.tolist())}
+
+
+def _source_ids(hypergraph: FrozenTimeVaryingHypergraph, source_vertices):
+    if hypergraph.window_epochs is not None:
+        raise ValueError('Batched engines need the whole hypergraph, not a time window')
+    if source_vertices is None:
+        source_vertices = hypergraph.vertex_names
+    source_vertices = list(dict.fromkeys(source_vertices))
+    return source_vertices, np.array([hypergraph.vertex_id(vertex) for vertex in source_vertices], dtype=np.int64)
+
+
+def _foremost_sweep(hypergraph: FrozenTimeVaryingHypergraph, sources, chronological_order, group_starts):
+    # reached[v] is the packed bitset of sources that have reached v strictly before the current timing
+    reached = np.zeros((len(hypergraph.vertex_names), (len(sources) + 7) // 8), dtype=np.uint8)
+    _set_source_bits(reached, sources)
+    hits_targets, hits_sources, hits_hedges = [], [], []
+
+    for start, end in zip(group_starts, group_starts[1:]):
+        # hyperedges sharing a timing must not pass information among each other, so they all read the
+        # state before the group and update it afterwards
+        pending = []
+        for hedge in chronological_order[start:end]:
+            hedge_vertices = hypergraph.vertex_ids(hedge)
+            if len(hedge_vertices) == 0:
+                continue
+            mask = np.bitwise_or.reduce(reached[hedge_vertices], axis=0)
+            if mask.any():
+                pending += [(hedge, hedge_vertices, mask)]
+        for hedge, hedge_vertices, mask in pending:
+            new = mask & ~reached[hedge_vertices]
+            if new.any():
+                rows, bits = _unpack_source_bits(new)
+                hits_targets += [hedge_vertices[rows]]
+                hits_sources += [bits]
+                hits_hedges += [np.full(len(rows), hedge)]
+                reached[hedge_vertices] |= mask
+
+    hedges = np.concatenate(hits_hedges) if hits_hedges else np.zeros(0, dtype=np.int64)
+    return _group_by_source(sources, hits_targets, hits_sources, hypergraph.epochs[hedges])
+
+
+def all_pairs_foremost(hypergraph: TimeVaryingHypergraph, source_vertices=None, block_size=1024):
+    # Earliest arrival needs no priority queue: a single chronological pass over the hyperedges propagates
+    # the arrival of a whole block of sources at once, carried as packed bitsets per vertex.
+    hypergraph = hypergraph.freeze()
+    source_vertices, sources = _source_ids(hypergraph, source_vertices)
+
+    chronological_order = np.argsort(hypergraph.epochs, kind='stable')
+    sorted_epochs = hypergraph.epochs[chronological_order]
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_epochs)) + 1, [len(sorted_epochs)])).tolist()
+
+    for block_start in range(0, len(sources), block_size):
+        block = sources[block_start:block_start + block_size]
+        distances = _foremost_sweep(hypergraph, block, chronological_order, group_starts)
+        for source_vertex, source in zip(source_vertices[block_start:block_start + block_size], block.tolist()):
+            yield source_vertex, _to_output(hypergraph, distances[source], DistanceType.FOREMOST)
+
+
+def _successor_scan_index(hypergraph: FrozenTimeVaryingHypergraph):
+    # Along each vertex's chronological incidence list, the temporal predecessors of an incidence are all
+    # incidences before the first one sharing its timing; predecessors[i] is the last of them (or -1).
+    positions = np.arange(len(hypergraph.vertex_hedges))
+    degrees = np.diff(hypergraph.vertex_offsets)
+    segment_starts = np.repeat(hypergraph.vertex_offsets[:-1], degrees)
+    new_timing = positions == segment_starts
+    new_timing[1:] |= hypergraph.vertex_epochs[1:] != hypergraph.vertex_epochs[:-1]
+    timing_starts = np.maximum.accumulate(np.where(new_timing, positions, 0))
+    predecessors = np.where(timing_starts > segment_starts, timing_starts - 1, -1)
+    by_hedge = np.argsort(hypergraph.vertex_hedges, kind='stable')
+    hedges, hedge_starts = np.unique(hypergraph.vertex_hedges[by_hedge], return_index=True)
+    vertices = np.flatnonzero(degrees)
+    return positions, segment_starts, predecessors, by_hedge, hedges, hedge_starts, vertices, int(degrees.max(initial=1))
+
+
+def _shortest_bfs(hypergraph: FrozenTimeVaryingHypergraph, sources, scan_index):  # pylint: disable=too-many-locals
+    positions, segment_starts, predecessors, by_hedge, hedges, hedge_starts, vertices, max_degree = scan_index
+    num_words = (len(sources) + 63) // 64
+    vertex_hedges = hypergraph.vertex_hedges
+
+    # Packed bitsets are stored as bytes to fix the bit order, but combined as 64-bit words
+    frontier = np.zeros((len(hypergraph.hedge_names), num_words * 8), dtype=np.uint8)
+    for bit, source in enumerate(sources.tolist()):
+        frontier[hypergraph.hedge_ids(source), bit // 8] |= np.uint8(1 << (bit % 8))
+    reached_vertices = np.zeros((len(hypergraph.vertex_names), num_words * 8), dtype=np.uint8)
+    _set_source_bits(reached_vertices, sources)
+    frontier, reached_hedges, reached_vertices = frontier.view(np.uint64), frontier.view(np.uint64).copy(), reached_vertices.view(np.uint64)
+    hits_targets, hits_sources, hits_levels = [], [], []
+
+    level = 1
+    while True:
+        # vertices first reached at this level, i.e. vertices of hyperedges newly reached at this level
+        vertex_frontier = np.zeros_like(reached_vertices)
+        if len(vertices):
+            vertex_frontier[vertices] = np.bitwise_or.reduceat(frontier[vertex_hedges], hypergraph.vertex_offsets[vertices], axis=0)
+        new = vertex_frontier & ~reached_vertices
+        reached_vertices |= new
+        rows, bits = _unpack_source_bits(new.view(np.uint8))
+        hits_targets += [rows]
+        hits_sources += [bits]
+        hits_levels += [np.full(len(rows), level)]
+
+        # inclusive segmented OR-scan of the frontier along each vertex's chronological incidence list
+        scan = frontier[vertex_hedges]
+        if not scan.any():
+            break
+        step = 1
+        while step < max_degree:
+            valid = positions[step:] - step >= segment_starts[step:]
+            shifted = np.zeros_like(scan)
+            shifted[step:][valid] = scan[:-step][valid]
+            scan |= shifted
+            step *= 2
+
+        # a hyperedge is reached at the next level by every source that reached a strictly earlier hyperedge of
+        # one of its vertices at this level
+        incoming = np.zeros_like(scan)
+        incoming[predecessors >= 0] = scan[predecessors[predecessors >= 0]]
+        candidates = np.zeros_like(frontier)
+        candidates[hedges] = np.bitwise_or.reduceat(incoming[by_hedge], hedge_starts, axis=0)
+        frontier = candidates & ~reached_hedges
+        reached_hedges |= frontier
+        level += 1
+
+    return _group_by_source(sources, hits_targets, hits_sources, np.concatenate(hits_levels))
+
+
+def all_pairs_shortest(hypergraph: TimeVaryingHypergraph, source_vertices=None, block_size=256):
+    # Multi-source BFS over the temporal successor relation of hyperedges: a block of sources advances one hop
+    # at a time, with the sources that reached each hyperedge carried as packed bitsets.
+    hypergraph = hypergraph.freeze()
+    source_vertices, sources = _source_ids(hypergraph, source_vertices)
+    scan_index = _successor_scan_index(hypergraph)
+
+    for block_start in range(0, len(sources), block_size):
+        block = sources[block_start:block_start + block_size]
+        distances = _shortest_bfs(hypergraph, block, scan_index)
+        for source_vertex, source in zip(source_vertices[block_start:block_start + block_size], block.tolist()):
+            yield source_vertex, _to_output(hypergraph, distances[source], DistanceType.SHORTEST)
+
+
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def count_bits(bitsets):
+    # Number of set bits in each row of packed bitsets
+    return _POPCOUNT[bitsets].sum(axis=-1, dtype=np.int64)
+
+
+def _reachability_sweep(hypergraph: FrozenTimeVaryingHypergraph, targets, groups):
+    # reach[v] is the packed bitset of targets that v reaches via hyperedges strictly later than the current
+    # timing, including v itself; a hyperedge reaches the union of the bitsets of its vertices
+    reach = np.zeros((len(hypergraph.vertex_names), (len(targets) + 63) // 64 * 8), dtype=np.uint8)
+    _set_source_bits(reach, targets)
+    reach = reach.view(np.uint64)
+    for group in groups:
+        # hyperedges sharing a timing do not reach each other, so they all read the state before the group
+        unions = [(hedge_vertices, np.bitwise_or.reduce(reach[hedge_vertices], axis=0)) for hedge_vertices in group]
+        for hedge_vertices, union in unions:
+            reach[hedge_vertices] |= union
+    return reach.view(np.uint8)
+
+
+def all_pairs_reachability(hypergraph: TimeVaryingHypergraph, source_vertices=None, block_size=1 << 15, target_vertices=None):
+    # Reachability needs no distances: a single reverse-chronological pass over the hyperedges finds the targets
+    # every vertex reaches for a whole block of targets at once. Yields the blocks of targets with the packed
+    # bitsets (little bit order) of the block reached by each source; sources do not reach themselves. The
+    # targets are all vertices, in the order of the sources followed by the other vertices, unless given.
+    hypergraph = hypergraph.freeze()
+    source_vertices, sources = _source_ids(hypergraph, source_vertices)
+    if target_vertices is None:
+        sourced = set(source_vertices)
+        target_vertices = source_vertices + [vertex for vertex in hypergraph.vertex_names if vertex not in sourced]
+    target_vertices, target_ids = _source_ids(hypergraph, target_vertices)
+
+    chronological_order = np.argsort(hypergraph.epochs, kind='stable')
+    sorted_epochs = hypergraph.epochs[chronological_order]
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_epochs)) + 1, [len(sorted_epochs)])).tolist()
+    groups = [[hedge_vertices for hedge_vertices in map(hypergraph.vertex_ids, chronological_order[start:end].tolist()) if len(hedge_vertices)]
+              for start, end in reversed(list(zip(group_starts, group_starts[1:])))]
+
+    for block_start in range(0, len(target_ids), block_size):
+        targets = target_ids[block_start:block_start + block_size]
+        reach = _reachability_sweep(hypergraph, targets, groups)
+        bits = np.arange(len(targets))
+        reach[targets, bits // 8] &= ~np.left_shift(1, bits % 8).astype(np.uint8)
+        yield target_vertices[block_start:block_start + block_size], reach[sources, :(len(targets) + 7) // 8]
+
+
+def all_pairs_reachable_counts(hypergraph: TimeVaryingHypergraph, source_vertices=None, block_size=1 << 15):
+    # Number of vertices each source reaches, among all vertices
+    hypergraph = hypergraph.freeze()
+    source_vertices, _ = _source_ids(hypergraph, source_vertices)
+    counts = np.zeros(len(source_vertices), dtype=np.int64)
+    for _, reached in all_pairs_reachability(hypergraph, source_vertices, block_size):
+        counts += count_bits(reached)
+    return dict(zip(source_vertices, counts.tolist()))
+
+
+def single_source_successor_dag(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, dag: SuccessorDag = None):  # pylint: disable=too-many-branches
+    # Dynamic programming over the precomputed successor DAG in topological order: every reached hyperedge is
+    # finalised once all of its (earlier) predecessors have been, so it is expanded exactly once.
+    distance_type = DistanceType(distance_type)
+    hypergraph = hypergraph.freeze()
+    if dag is None:
+        dag = hypergraph.successor_dag(reduced=distance_type is not DistanceType.SHORTEST)
+    if dag.reduced and distance_type is DistanceType.SHORTEST:
+        raise ValueError('Shortest distances require the full successor DAG')
+    hedge_vertices, vertex_hedges, timings, _ = hypergraph.adjacency()
+    successors, ranks = dag.adjacency()
+    source = hypergraph.vertex_id(source_vertex)
+
+    hedge_distances: dict = {}
+    queue: list = []
+    for source_hedge in vertex_hedges[source]:
+        match distance_type:
+            case DistanceType.SHORTEST:
+                hedge_distances[source_hedge] = 1
+            case DistanceType.FASTEST:
+                hedge_distances[source_hedge] = 0
+            case DistanceType.FOREMOST:
+                hedge_distances[source_hedge] = timings[source_hedge]
+        heapq.heappush(queue, (ranks[source_hedge], source_hedge))
+
+    while queue:
+        _, hedge = heapq.heappop(queue)
+        distance, hedge_timing = hedge_distances[hedge], timings[hedge]
+        for next_hedge in successors[hedge]:
+            match distance_type:
+                case DistanceType.SHORTEST:
+                    new_distance = distance + 1
+                case DistanceType.FASTEST:
+                    new_distance = distance + (timings[next_hedge] - hedge_timing)
+                case DistanceType.FOREMOST:
+                    new_distance = timings[next_hedge]
+            if next_hedge not in hedge_distances:
+                hedge_distances[next_hedge] = new_distance
+                heapq.heappush(queue, (ranks[next_hedge], next_hedge))
+            elif new_distance < hedge_distances[next_hedge]:
+                hedge_distances[next_hedge] = new_distance
+
+    vertex_distances: dict = {}
+    for hedge, distance in hedge_distances.items():
+        for vertex in hedge_vertices[hedge]:
+            if vertex not in vertex_distances or distance < vertex_distances[vertex]:
+                vertex_distances[vertex] = distance
+    vertex_distances.pop(source, None)
+    return _to_output(hypergraph, vertex_distances, distance_type)
+
+
+def _all_distances_sweep(hypergraph: FrozenTimeVaryingHypergraph, source, seeds=None, min_epoch=None, end_epochs=(None, )):  # pylint: disable=too-many-locals,too-many-branches,too-many-arguments,too-many-statements
+    # One chronological traversal of the hyperedges reachable from the source yields all three distances: a
+    # hyperedge's labels follow from aggregates over its vertices, namely the fewest hops and the latest start
+    # of any strictly earlier reached hyperedge. Every reached vertex keeps a cursor into its chronological
+    # incidence list, so each incidence is pushed at most once. The traversal may also continue earlier
+    # results: it then only visits hyperedges from min_epoch on, and seeds maps the vertices reached before to
+    # their (hops, start) aggregates. Before the first hyperedge at or after each of the ascending end_epochs
+    # (None for the end), it yields the aggregates so far, which the caller has to use before resuming it.
+    hedge_vertices, vertex_hedges, _, vertex_timings = hypergraph.adjacency()
+    seeds = seeds or {}
+
+    hops = {vertex: hop for vertex, (hop, _) in seeds.items()}
+    starts = {vertex: start for vertex, (_, start) in seeds.items()}
+    durations: dict = {}
+    arrivals: dict = {}
+    queue = []
+    for vertex in (source, *seeds):
+        i = 0 if min_epoch is None else bisect_left(vertex_timings[vertex], min_epoch)
+        if i < len(vertex_hedges[vertex]):
+            queue += [(vertex_timings[vertex][i], vertex_hedges[vertex][i], vertex, i)]
+    heapq.heapify(queue)
+    # pops and label updates follow from the counts per group, which keeps the counting out of the inner loops
+    pushes, hedges, source_hedges, scanned = len(queue), 0, 0, 0
+
+    end_epochs = list(end_epochs)
+    while queue:
+        timing = queue[0][0]
+        while end_epochs[0] is not None and timing >= end_epochs[0]:
+            yield hops, starts, durations, arrivals
+            end_epochs.pop(0)
+            if not end_epochs:
+                _count(pushes, pushes - len(queue), pushes - len(queue) - hedges, scanned - source_hedges, scanned)
+                return
+        group = {}
+        while queue and queue[0][0] == timing:
+            _, hedge, vertex, i = heapq.heappop(queue)
+            group[hedge] = None
+            if i + 1 < len(vertex_hedges[vertex]):
+                heapq.heappush(queue, (vertex_timings[vertex][i + 1], vertex_hedges[vertex][i + 1], vertex, i + 1))
+                pushes += 1
+        # the hyperedges popped more than once were reached via several of their vertices
+        hedges += len(group)
+
+        # labels of the whole group are computed before any of them is applied, as hyperedges sharing a timing
+        # cannot pass information among each other
+        labels = []
+        for hedge in group:
+            scanned += len(hedge_vertices[hedge])
+            if source in hedge_vertices[hedge]:
+                source_hedges += 1
+                labels += [(hedge, 1, timing)]
+            else:
+                reached = [vertex for vertex in hedge_vertices[hedge] if vertex in hops]
+                labels += [(hedge, 1 + min(hops[vertex] for vertex in reached), max(starts[vertex] for vertex in reached))]
+
+        for hedge, hop, start in labels:
+            for vertex in hedge_vertices[hedge]:
+                if vertex == source:
+                    continue
+                if vertex not in arrivals:
+                    durations[vertex], arrivals[vertex] = timing - start, timing
+                    if vertex in seeds:
+                        hops[vertex], starts[vertex] = min(hops[vertex], hop), max(starts[vertex], start)
+                        continue
+                    hops[vertex], starts[vertex] = hop, start
+                    i = bisect_right(vertex_timings[vertex], timing)
+                    if i < len(vertex_hedges[vertex]):
+                        heapq.heappush(queue, (vertex_timings[vertex][i], vertex_hedges[vertex][i], vertex, i))
+                        pushes += 1
+                else:
+                    hops[vertex] = min(hops[vertex], hop)
+                    starts[vertex] = max(starts[vertex], start)
+                    durations[vertex] = min(durations[vertex], timing - start)
+    _count(pushes, pushes - len(queue), pushes - len(queue) - hedges, scanned - source_hedges, scanned)
+    for _ in end_epochs:
+        yield hops, starts, durations, arrivals
+
+
+def _all_distances_traversal(hypergraph: FrozenTimeVaryingHypergraph, source, seeds=None, min_epoch=None):
+    return next(_all_distances_sweep(hypergraph, source, seeds, min_epoch))
+
+
+def single_source_all_distances(hypergraph: TimeVaryingHypergraph, source_vertex, latest_starts=False):
+    # With latest_starts, every target also gets the latest start of a path reaching it, which is needed to
+    # continue the distances when later hyperedges are added (see update_all_distances)
+    hypergraph = hypergraph.freeze()
+    hops, starts, durations, arrivals = _all_distances_traversal(hypergraph, hypergraph.vertex_id(source_vertex))
+    vertex_names = hypergraph.vertex_names
+    if latest_starts:
+        return {vertex_names[vertex]: (hop, hypergraph.to_duration(durations[vertex]), hypergraph.to_timing(arrivals[vertex]), hypergraph.to_timing(starts[vertex])) for vertex, hop in hops.items()}
+    return {vertex_names[vertex]: (hop, hypergraph.to_duration(durations[vertex]), hypergraph.to_timing(arrivals[vertex])) for vertex, hop in hops.items()}
+
+
+def single_source_all_distances_until(hypergraph: TimeVaryingHypergraph, source_vertex, end_timings):
+    # Distances over the hyperedges before each of the ascending end timings, e.g. of growing time windows with
+    # a common start, from a single traversal; yields a dictionary like single_source_all_distances per end
+    hypergraph = hypergraph.freeze()
+    if not end_timings:
+        return
+    vertex_names = hypergraph.vertex_names
+    for hops, _, durations, arrivals in _all_distances_sweep(hypergraph, hypergraph.vertex_id(source_vertex), end_epochs=[to_epoch(end_timing) for end_timing in end_timings]):
+        yield {vertex_names[vertex]: (hop, hypergraph.to_duration(durations[vertex]), hypergraph.to_timing(arrivals[vertex])) for vertex, hop in hops.items()}
 
-    minimal_distances: dict = {}
-    for vertex, distance in distances.items():
-        if vertex not in minimal_distances or distance < minimal_distances[vertex]:
-            minimal_distances[vertex] = distance
-    minimal_distances.pop(source_vertex)
 
-    return minimal_distances
\ No newline at end of file
+def update_all_distances(hypergraph: TimeVaryingHypergraph, previous, min_timing):
+    # Continues all-pairs distances over the hyperedges before min_timing with the hyperedges at or after it,
+    # which must be later than all others. Only paths ending in these new hyperedges can change a distance, so
+    # only sources that are in or reached a vertex of them are traversed again, over the new hyperedges alone.
+    # previous maps sources to their {target: (hops, duration, arrival, latest start)}, at least for the
+    # vertices of the new hyperedges; yields the new or changed distances of every affected source.
+    hypergraph = hypergraph.freeze()
+    min_epoch = to_epoch(min_timing)
+    vertex_names = hypergraph.vertex_names
+    tail_vertices = {vertex_names[vertex] for hedge in np.flatnonzero(np.asarray(hypergraph.epochs) >= min_epoch) for vertex in hypergraph.vertex_ids(hedge)}
+    affected = tail_vertices | {source for source, distances in previous.items() if not tail_vertices.isdisjoint(distances)}
+    for source_vertex in sorted(affected):
+        distances = previous.get(source_vertex, {})
+        seeds = {hypergraph.vertex_id(target): (distances[target][0], to_epoch(distances[target][3])) for target in tail_vertices if target in distances}
+        hops, starts, durations, arrivals = _all_distances_traversal(hypergraph, hypergraph.vertex_id(source_vertex), seeds, min_epoch)
+        changes = {}
+        for vertex, arrival in arrivals.items():
+            target = vertex_names[vertex]
+            distance = (hops[vertex], hypergraph.to_duration(durations[vertex]), hypergraph.to_timing(arrival), hypergraph.to_timing(starts[vertex]))
+            if target in distances:
+                hop, duration, arrival_, start = distances[target]
+                distance = (min(hop, distance[0]), min(duration, distance[1]), arrival_, max(start, distance[3]))
+                if distance == tuple(distances[target]):
+                    continue
+            changes[target] = distance
+        yield source_vertex, changes
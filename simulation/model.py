@@ -1,18 +1,47 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
+from collections.abc import Sequence
 from pathlib import Path
+from bisect import bisect_left
+import copy
+import hashlib
+import shutil
 import bz2
 
+import numpy as np
+
 try:
     import orjson as json
 except ImportError:
     import json
 
 
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+BZ2_STREAM_SIZE = 1 << 22
+
+
 class EntityNotFound(Exception):
     pass
 
 
+def to_epoch(timing):
+    if isinstance(timing, datetime):
+        delta = timing - (EPOCH if timing.tzinfo is None else EPOCH_UTC)
+        return delta // timedelta(microseconds=1) * 1000
+    if isinstance(timing, (int, np.integer)):
+        return int(timing)
+    raise TypeError(f'Cannot represent timing {timing!r} as int64 epoch')
+
+
+def to_epoch_delta(duration):
+    if isinstance(duration, timedelta):
+        return duration // timedelta(microseconds=1) * 1000
+    if isinstance(duration, (int, np.integer)):
+        return int(duration)
+    raise TypeError(f'Cannot represent duration {duration!r} as int64 epoch delta')
+
+
 class TimeVaryingHypergraph:
     def __init__(self, hedges: dict, timings: dict):
         self._vertices = defaultdict(list)
@@ -22,6 +51,7 @@ class TimeVaryingHypergraph:
 
         self._hedges = hedges
         self._timings = timings
+        self._frozen = None
 
     def timings(self, entity=None):
         if entity is None:
@@ -42,6 +72,467 @@ class TimeVaryingHypergraph:
             return set(self._vertices[vertex])
         raise EntityNotFound(f'Unknown vertex {vertex}')
 
+    def hyperedges_after(self, vertex, timing):
+        return self.freeze().hyperedges_after(vertex, timing)
+
+    def add_hyperedges(self, hedges: dict, timings: dict):
+        # Appends hyperedges that are strictly later than all present ones, like the channels of new code reviews
+        for hedge in hedges:
+            if hedge in self._hedges:
+                raise ValueError(f'Hyperedge {hedge} already exists')
+            if hedge not in timings:
+                raise ValueError(f'Missing timing of hyperedge {hedge}')
+        if hedges and self._timings and min(timings[hedge] for hedge in hedges) <= max(self._timings.values()):
+            raise ValueError('New hyperedges must be later than all present hyperedges')
+        self._hedges = {**self._hedges, **hedges}
+        self._timings = {**self._timings, **{hedge: timings[hedge] for hedge in hedges}}
+        for hedge, _vertices in hedges.items():
+            for vertex in _vertices:
+                self._vertices[vertex] += [hedge]
+        self._frozen = None
+
+    def freeze(self):
+        if self._frozen is None:
+            vertex_names = tuple(self._vertices)
+            vertex_index = {vertex: i for i, vertex in enumerate(vertex_names)}
+            hedge_names = tuple(self._hedges)
+            hedge_offsets = np.zeros(len(hedge_names) + 1, dtype=np.int64)
+            hedge_offsets[1:] = np.cumsum([len(self._hedges[hedge]) for hedge in hedge_names])
+            hedge_vertices = np.fromiter((vertex_index[vertex] for hedge in hedge_names for vertex in self._hedges[hedge]),
+                                         dtype=np.int32, count=hedge_offsets[-1])
+            timings = [self._timings[hedge] for hedge in hedge_names]
+            self._frozen = self._frozen_type().from_arrays(vertex_names, hedge_names, hedge_offsets, hedge_vertices, timings)
+        return self._frozen
+
+    def _frozen_type(self):
+        return FrozenTimeVaryingHypergraph
+
+
+class NameTable(Sequence):
+    # Names stored as one NUL-separated UTF-8 buffer, e.g. memory-mapped from a columnar file; they are only
+    # decoded when first accessed. Integer names, like the hashed IDs of the published participants, are stored
+    # as an int64 array instead and keep their type.
+    def __init__(self, buffer, count):
+        self._buffer = buffer
+        self._count = count
+        self._names = None
+
+    @staticmethod
+    def encode(names):
+        names = list(names)
+        if names and all(isinstance(name, (int, np.integer)) for name in names):
+            return np.array(names, dtype=np.int64)
+        if not all(isinstance(name, str) for name in names):
+            raise TypeError(f'Names must be all strings or all integers, not {", ".join(sorted({type(name).__name__ for name in names}))}')
+        return np.frombuffer('\0'.join(names).encode('utf-8'), dtype=np.uint8)
+
+    def names(self):
+        if self._names is None:
+            if self._buffer.dtype == np.int64:
+                self._names = tuple(self._buffer.tolist())
+            else:
+                self._names = tuple(bytes(self._buffer).decode('utf-8').split('\0')) if self._count else ()
+        return self._names
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return self.names()[index]
+
+    def __iter__(self):
+        return iter(self.names())
+
+
+class FrozenTimeVaryingHypergraph(TimeVaryingHypergraph):
+    # Vertices and hyperedges are interned to dense ints; the incidence is kept as CSR arrays in both
+    # directions and the timings as an int64 epoch array (nanoseconds for datetime timings).
+    def __init__(self, vertex_names, hedge_names, hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, epochs, timezone_=None, datetimes=False, vertex_epochs=None):  # pylint: disable=too-many-arguments,super-init-not-called
+        self.vertex_names = vertex_names
+        self.hedge_names = hedge_names
+        self.hedge_offsets = hedge_offsets
+        self.hedge_vertices = hedge_vertices
+        self.vertex_offsets = vertex_offsets
+        self.vertex_hedges = vertex_hedges
+        self.epochs = epochs
+        self.timezone = timezone_
+        self.datetimes = datetimes
+        self.vertex_epochs = epochs[vertex_hedges] if vertex_epochs is None else vertex_epochs
+        self._vertex_index = None
+        self._hedge_index = None
+        self._adjacency = None
+        self._successor_dags = {}
+        self._columnar_path = None
+        self.window_epochs = None
+        self._base = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_adjacency'] = None
+        state['_successor_dags'] = {}
+        return state
+
+    def __copy__(self):
+        hypergraph = object.__new__(type(self))
+        hypergraph.__dict__.update(self.__dict__)
+        return hypergraph
+
+    def __reduce_ex__(self, protocol):
+        # a network attached to a columnar file is sent to other processes as its path, which they map again
+        if self._columnar_path is not None and self.window_epochs is None:
+            return (_attach_columnar, (type(self), self._columnar_path, self.__dict__.get('name')))
+        return super().__reduce_ex__(protocol)
+
+    @classmethod
+    def from_arrays(cls, vertex_names, hedge_names, hedge_offsets, hedge_vertices, timings, datetimes=None, timezone_=None, **kwargs):  # pylint: disable=too-many-arguments
+        hedge_offsets = np.asarray(hedge_offsets, dtype=np.int64)
+        hedge_vertices = np.asarray(hedge_vertices, dtype=np.int32)
+        if len(hedge_offsets) != len(hedge_names) + 1 or hedge_offsets[-1] != len(hedge_vertices):
+            raise ValueError('Hyperedge offsets do not match the hyperedges and their vertices')
+
+        if isinstance(timings, np.ndarray) and np.issubdtype(timings.dtype, np.integer):
+            epochs = timings.astype(np.int64, copy=False)
+        else:
+            timings = list(timings)
+            if datetimes is None:
+                datetimes = bool(timings) and isinstance(timings[0], datetime)
+                timezone_ = timings[0].tzinfo if datetimes else None
+            epochs = np.fromiter((to_epoch(timing) for timing in timings), dtype=np.int64, count=len(timings))
+        if len(epochs) != len(hedge_names):
+            raise ValueError('Timings do not match the hyperedges')
+
+        # The hyperedges of each vertex are kept in chronological order, so temporal successors are a suffix
+        hedge_of_incidence = np.repeat(np.arange(len(hedge_names), dtype=np.int32), np.diff(hedge_offsets))
+        vertex_hedges = hedge_of_incidence[np.lexsort((epochs[hedge_of_incidence], hedge_vertices))]
+        vertex_offsets = np.zeros(len(vertex_names) + 1, dtype=np.int64)
+        vertex_offsets[1:] = np.cumsum(np.bincount(hedge_vertices, minlength=len(vertex_names)))
+
+        return cls(tuple(vertex_names), tuple(hedge_names), hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, epochs,
+                   timezone_=timezone_, datetimes=bool(datetimes), **kwargs)
+
+    def freeze(self):
+        return self
+
+    def add_hyperedges(self, hedges: dict, timings: dict):
+        raise TypeError('Frozen hypergraphs cannot be changed; add the hyperedges to the original hypergraph and freeze it again')
+
+    def vertex_id(self, vertex):
+        if self._vertex_index is None:
+            self._vertex_index = {vertex: i for i, vertex in enumerate(self.vertex_names)}
+        if vertex in self._vertex_index:
+            return self._vertex_index[vertex]
+        raise EntityNotFound(f'Unknown vertex {vertex}')
+
+    def hedge_id(self, hedge):
+        if self._hedge_index is None:
+            self._hedge_index = {hedge: i for i, hedge in enumerate(self.hedge_names)}
+        if hedge in self._hedge_index:
+            return self._hedge_index[hedge]
+        raise EntityNotFound(f'Unknown hyperedge {hedge}')
+
+    def window(self, start=None, end=None):
+        # View of the hyperedges with timings in [start, end): it shares all arrays with the hypergraph, and as the
+        # incidence lists are chronological, restricts them to slices. Engines working on the adjacency accept
+        # windows; those working on the CSR arrays directly need the whole hypergraph.
+        base = self if self._base is None else self._base
+        start_epoch, end_epoch = self.window_epochs or (np.iinfo(np.int64).min, np.iinfo(np.int64).max)
+        view = copy.copy(base)
+        view.window_epochs = (start_epoch if start is None else max(start_epoch, to_epoch(start)), end_epoch if end is None else min(end_epoch, to_epoch(end)))
+        view._base = base  # pylint: disable=protected-access
+        view._adjacency = None  # pylint: disable=protected-access
+        view._successor_dags = {}  # pylint: disable=protected-access
+        view.datetimes, view.timezone = self.datetimes, self.timezone
+        return view
+
+    def as_epochs(self):
+        # View whose timings and durations are the int64 epochs themselves (nanoseconds for datetimes): the engines
+        # then return plain ints, which are cheaper to compare, allocate and store than datetime and timedelta.
+        # Convert them back with to_timing and to_duration of the hypergraph, or by column in pandas (see to_frame).
+        view = copy.copy(self)
+        view.datetimes, view.timezone = False, None
+        view._columnar_path = None  # pylint: disable=protected-access
+        return view
+
+    def pruned(self):
+        # Copy without the hyperedges that cannot improve any distance, with the number pruned per reason. A
+        # hyperedge of fewer than two vertices only reaches its vertex, which got there earlier or is the source;
+        # one whose vertices all take part in another hyperedge of the same timing can be swapped for it in any
+        # path (of equal vertex sets the first is kept). Supersets of other timings are no substitute: later ones
+        # delay foremost arrivals and earlier ones lengthen fastest paths. Vertices and their IDs are kept.
+        self._require_whole()
+        sizes = np.diff(self.hedge_offsets)
+        # a vertex may be listed more than once in a hyperedge, so its distinct vertices are counted
+        hedge_of_incidence = np.repeat(np.arange(len(sizes)), sizes)
+        order = np.lexsort((self.hedge_vertices, hedge_of_incidence))
+        hedges, vertices = hedge_of_incidence[order], np.asarray(self.hedge_vertices)[order]
+        distinct = np.ones(len(order), dtype=bool)
+        distinct[1:] = (hedges[1:] != hedges[:-1]) | (vertices[1:] != vertices[:-1])
+        small = np.bincount(hedges[distinct], minlength=len(sizes)) < 2
+        dominated = np.zeros(len(sizes), dtype=bool)
+        _, group_of_hedge = np.unique(self.epochs, return_inverse=True)
+        concurrent = np.bincount(group_of_hedge[~small], minlength=len(sizes))[group_of_hedge] > 1
+        groups = defaultdict(list)
+        for hedge in np.flatnonzero(concurrent & ~small).tolist():
+            groups[group_of_hedge[hedge]].append(hedge)
+        for hedges in groups.values():
+            vertex_sets = {hedge: frozenset(self.vertex_ids(hedge).tolist()) for hedge in hedges}
+            containing = defaultdict(set)
+            for hedge, vertices in vertex_sets.items():
+                for vertex in vertices:
+                    containing[vertex].add(hedge)
+            for hedge, vertices in vertex_sets.items():
+                supersets = set.intersection(*(containing[vertex] for vertex in vertices)) - {hedge}
+                dominated[hedge] = any(len(vertex_sets[other]) > len(vertices) or other < hedge for other in supersets)
+
+        keep = ~(small | dominated)
+        hedge_offsets = np.zeros(np.count_nonzero(keep) + 1, dtype=np.int64)
+        hedge_offsets[1:] = np.cumsum(sizes[keep])
+        pruned = type(self).from_arrays(self.vertex_names, tuple(self.hedge_names[hedge] for hedge in np.flatnonzero(keep).tolist()), hedge_offsets,
+                                        np.asarray(self.hedge_vertices)[np.repeat(keep, sizes)], np.asarray(self.epochs)[keep],
+                                        datetimes=self.datetimes, timezone_=self.timezone)
+        report = {'hedges': len(sizes), 'small': int(np.count_nonzero(small)), 'concurrent_subsets': int(np.count_nonzero(dominated)),
+                  'incidences': int(sizes.sum()), 'pruned_incidences': int(sizes[~keep].sum())}
+        return pruned, report
+
+    def vertex_classes(self):
+        # Representative of each vertex, the first vertex with the same hyperedges. Such vertices reach all others
+        # with the same distances and each other with those of their first and last hyperedge, so the distances of
+        # a representative serve its whole class (see class_distances in the run module).
+        self._require_whole()
+        vertex_hedges = np.asarray(self.vertex_hedges)
+        offsets = self.vertex_offsets.tolist()
+        first = {}
+        return np.array([first.setdefault(vertex_hedges[start:end].tobytes(), vertex) for vertex, (start, end) in enumerate(zip(offsets, offsets[1:]))], dtype=np.int64)
+
+    def _require_whole(self):
+        if self.window_epochs is not None:
+            raise ValueError('This operation needs the whole hypergraph, not a time window')
+
+    def _in_window(self, hedge_id):
+        return self.window_epochs is None or self.window_epochs[0] <= self.epochs[hedge_id] < self.window_epochs[1]
+
+    def _window_hedge_ids(self):
+        if self.window_epochs is None:
+            return np.arange(len(self.hedge_names))
+        return np.flatnonzero((self.epochs >= self.window_epochs[0]) & (self.epochs < self.window_epochs[1]))
+
+    def _incidence_range(self, vertex_id):
+        start, end = self.vertex_offsets[vertex_id], self.vertex_offsets[vertex_id + 1]
+        if self.window_epochs is not None:
+            start, end = start + np.searchsorted(self.vertex_epochs[start:end], self.window_epochs)
+        return start, end
+
+    def vertex_ids(self, hedge_id):
+        return self.hedge_vertices[self.hedge_offsets[hedge_id]:self.hedge_offsets[hedge_id + 1]]
+
+    def hedge_ids(self, vertex_id):
+        start, end = self._incidence_range(vertex_id)
+        return self.vertex_hedges[start:end]
+
+    def hedge_ids_after(self, vertex_id, epoch):
+        start, end = self._incidence_range(vertex_id)
+        return self.vertex_hedges[start + np.searchsorted(self.vertex_epochs[start:end], epoch, side='right'):end]
+
+    def adjacency(self):
+        # Tuples of plain ints are considerably faster to iterate from Python than slices of the CSR arrays
+        if self._adjacency is None and self.window_epochs is not None:
+            hedge_vertices, vertex_hedges, timings, vertex_timings = self._base.adjacency()  # pylint: disable=protected-access
+            bounds = [(bisect_left(epochs, self.window_epochs[0]), bisect_left(epochs, self.window_epochs[1])) for epochs in vertex_timings]
+            self._adjacency = (hedge_vertices,
+                               tuple(hedges[start:end] for hedges, (start, end) in zip(vertex_hedges, bounds)),
+                               timings,
+                               tuple(epochs[start:end] for epochs, (start, end) in zip(vertex_timings, bounds)))
+        if self._adjacency is None:
+            hedge_offsets, hedge_vertices = self.hedge_offsets.tolist(), self.hedge_vertices.tolist()
+            vertex_offsets, vertex_hedges = self.vertex_offsets.tolist(), self.vertex_hedges.tolist()
+            vertex_epochs = self.vertex_epochs.tolist()
+            self._adjacency = (
+                tuple(tuple(hedge_vertices[start:end]) for start, end in zip(hedge_offsets, hedge_offsets[1:])),
+                tuple(tuple(vertex_hedges[start:end]) for start, end in zip(vertex_offsets, vertex_offsets[1:])),
+                self.epochs.tolist(),
+                tuple(tuple(vertex_epochs[start:end]) for start, end in zip(vertex_offsets, vertex_offsets[1:])))
+        return self._adjacency
+
+    def to_columnar(self, path):
+        self._require_whole()
+        if self.timezone is not None and self.timezone.utcoffset(None) is None:
+            raise ValueError(f'Cannot store timings of time zone {self.timezone} with a fixed UTC offset')
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / 'vertex_names.npy', NameTable.encode(self.vertex_names))
+        np.save(path / 'hedge_names.npy', NameTable.encode(self.hedge_names))
+        for name in COLUMNAR_ARRAYS:
+            np.save(path / f'{name}.npy', getattr(self, name))
+        metadata = json.dumps({
+            'num_vertices': len(self.vertex_names),
+            'num_hedges': len(self.hedge_names),
+            'datetimes': self.datetimes,
+            'utc_offset': None if self.timezone is None else self.timezone.utcoffset(None).total_seconds(),
+            'name': getattr(self, 'name', None)})
+        (path / 'metadata.json').write_bytes(metadata if isinstance(metadata, bytes) else metadata.encode('utf-8'))
+
+    @classmethod
+    def from_columnar(cls, path, **kwargs):
+        path = Path(path)
+        metadata = json.loads((path / 'metadata.json').read_bytes())
+        arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in COLUMNAR_ARRAYS}
+        utc_offset = metadata['utc_offset']
+        if 'name' in metadata and metadata['name'] is not None:
+            kwargs.setdefault('name', metadata['name'])
+        hypergraph = cls(NameTable(np.load(path / 'vertex_names.npy', mmap_mode='r'), metadata['num_vertices']),
+                         NameTable(np.load(path / 'hedge_names.npy', mmap_mode='r'), metadata['num_hedges']),
+                         arrays['hedge_offsets'], arrays['hedge_vertices'], arrays['vertex_offsets'], arrays['vertex_hedges'], arrays['epochs'],
+                         timezone_=None if utc_offset is None else timezone(timedelta(seconds=utc_offset)),
+                         datetimes=metadata['datetimes'], vertex_epochs=arrays['vertex_epochs'], **kwargs)
+        hypergraph._columnar_path = path  # pylint: disable=protected-access
+        return hypergraph
+
+    def content_hash(self):
+        digest = hashlib.sha256()
+        for array in (self.hedge_offsets, self.hedge_vertices, self.epochs):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        if self.window_epochs is not None:
+            digest.update(np.array(self.window_epochs, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    def successor_dag(self, reduced=False, cache_dir=None):
+        self._require_whole()
+        if reduced not in self._successor_dags:
+            if cache_dir is None:
+                dag = SuccessorDag.build(self, reduced)
+            else:
+                kind = 'reduced' if reduced else 'full'
+                path = Path(cache_dir) / f'{getattr(self, "name", None) or "hypergraph"}.{kind}-{self.content_hash()[:16]}.dag'
+                if path.exists():
+                    dag = SuccessorDag.load(path)
+                else:
+                    dag = SuccessorDag.build(self, reduced)
+                    dag.save(path)
+            self._successor_dags[reduced] = dag
+        return self._successor_dags[reduced]
+
+    def to_timing(self, epoch):
+        if not self.datetimes:
+            return epoch
+        if self.timezone is None:
+            return EPOCH + timedelta(microseconds=epoch // 1000)
+        return (EPOCH_UTC + timedelta(microseconds=epoch // 1000)).astimezone(self.timezone)
+
+    def to_duration(self, epoch_delta):
+        if not self.datetimes:
+            return epoch_delta
+        return timedelta(microseconds=epoch_delta // 1000)
+
+    def timings(self, entity=None):
+        if entity is None:
+            if self.window_epochs is None:
+                return {hedge: self.to_timing(int(epoch)) for hedge, epoch in zip(self.hedge_names, self.epochs)}
+            return {self.hedge_names[hedge]: self.to_timing(int(self.epochs[hedge])) for hedge in self._window_hedge_ids()}
+        return self.to_timing(int(self.epochs[self._window_hedge_id(entity)]))
+
+    def vertices(self, hedge=None):
+        if hedge is None:
+            if self.window_epochs is None:
+                return set(self.vertex_names)
+            vertex_of_incidence = np.repeat(np.arange(len(self.vertex_names)), np.diff(self.vertex_offsets))
+            return {self.vertex_names[i] for i in np.unique(vertex_of_incidence[(self.vertex_epochs >= self.window_epochs[0]) & (self.vertex_epochs < self.window_epochs[1])])}
+        return {self.vertex_names[i] for i in self.vertex_ids(self._window_hedge_id(hedge))}
+
+    def hyperedges(self, vertex=None):
+        if vertex is None:
+            return {self.hedge_names[i] for i in self._window_hedge_ids()} if self.window_epochs is not None else set(self.hedge_names)
+        return {self.hedge_names[i] for i in self.hedge_ids(self.vertex_id(vertex))}
+
+    def _window_hedge_id(self, hedge):
+        hedge_id = self.hedge_id(hedge)
+        if not self._in_window(hedge_id):
+            raise EntityNotFound(f'Hyperedge {hedge} is outside of the time window')
+        return hedge_id
+
+    def hyperedges_after(self, vertex, timing):
+        return [self.hedge_names[i] for i in self.hedge_ids_after(self.vertex_id(vertex), to_epoch(timing))]
+
+
+COLUMNAR_ARRAYS = ('hedge_offsets', 'hedge_vertices', 'vertex_offsets', 'vertex_hedges', 'vertex_epochs', 'epochs')
+
+
+def _attach_columnar(frozen_type, path, name=None):
+    return frozen_type.from_columnar(path) if name is None else frozen_type.from_columnar(path, name=name)
+
+
+class SuccessorDag:
+    # Hyperedges sharing a vertex with strictly increasing timing form a DAG; its edges are stored in CSR form
+    # and the chronological order of the hyperedges is a topological order. The reduced DAG keeps only the
+    # successors at the next timing along each vertex, which preserves reachability (and therefore fastest and
+    # foremost distances) but not the number of hops.
+    def __init__(self, offsets, successors, topological_order, reduced=False):
+        self.offsets = offsets
+        self.successors = successors
+        self.topological_order = topological_order
+        self.reduced = reduced
+        self._adjacency = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_adjacency'] = None
+        return state
+
+    @classmethod
+    def build(cls, hypergraph: FrozenTimeVaryingHypergraph, reduced=False):  # pylint: disable=too-many-locals
+        vertex_hedges, vertex_epochs = hypergraph.vertex_hedges, hypergraph.vertex_epochs
+        positions = np.arange(len(vertex_hedges))
+        degrees = np.diff(hypergraph.vertex_offsets)
+        segment_ends = np.repeat(hypergraph.vertex_offsets[1:], degrees)
+
+        # incidences of a vertex sharing a timing form a group; a group's successors start at the next group
+        new_timing = positions == np.repeat(hypergraph.vertex_offsets[:-1], degrees)
+        new_timing[1:] |= vertex_epochs[1:] != vertex_epochs[:-1]
+        group_starts = np.append(np.flatnonzero(new_timing), len(vertex_hedges))
+        groups = np.cumsum(new_timing) - 1
+        lower = group_starts[groups + 1]
+        if reduced:
+            upper = np.where(lower < segment_ends, group_starts[np.minimum(groups + 2, len(group_starts) - 1)], lower)
+        else:
+            upper = segment_ends
+
+        counts = upper - lower
+        sources = np.repeat(vertex_hedges, counts).astype(np.int64)
+        targets = vertex_hedges[np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lower, counts)]
+        num_hedges = len(hypergraph.hedge_names)
+        edges = np.unique(sources * num_hedges + targets)
+        offsets = np.searchsorted(edges // num_hedges if num_hedges else edges, np.arange(num_hedges + 1))
+        successors = (edges % num_hedges if num_hedges else edges).astype(np.int32)
+        return cls(offsets.astype(np.int64), successors, np.argsort(hypergraph.epochs, kind='stable'), reduced=reduced)
+
+    def save(self, path):
+        # written into a partial directory that is renamed at the end, so an interrupted save leaves no cache
+        path = Path(path)
+        partial_path = path.with_suffix('.partial')
+        shutil.rmtree(partial_path, ignore_errors=True)
+        partial_path.mkdir(parents=True)
+        for name in ('offsets', 'successors', 'topological_order'):
+            np.save(partial_path / f'{name}.npy', getattr(self, name))
+        (partial_path / 'reduced').write_text(str(int(self.reduced)))
+        shutil.rmtree(path, ignore_errors=True)
+        partial_path.rename(path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        path = Path(path)
+        arrays = [np.load(path / f'{name}.npy', mmap_mode=mmap_mode) for name in ('offsets', 'successors', 'topological_order')]
+        return cls(*arrays, reduced=(path / 'reduced').read_text() == '1')
+
+    def successor_ids(self, hedge_id):
+        return self.successors[self.offsets[hedge_id]:self.offsets[hedge_id + 1]]
+
+    def adjacency(self):
+        if self._adjacency is None:
+            offsets, successors = self.offsets.tolist(), self.successors.tolist()
+            ranks = np.empty(len(self.topological_order), dtype=np.int64)
+            ranks[self.topological_order] = np.arange(len(self.topological_order))
+            self._adjacency = (tuple(tuple(successors[start:end]) for start, end in zip(offsets, offsets[1:])), ranks.tolist())
+        return self._adjacency
+
 
 class CommunicationNetwork(TimeVaryingHypergraph):
 
@@ -55,6 +546,17 @@ class CommunicationNetwork(TimeVaryingHypergraph):
     def participants(self, channel=None):
         return self.vertices(channel)
 
+    def add_channels(self, channels, channel_timings):
+        self.add_hyperedges(channels, channel_timings)
+
+    def freeze(self):
+        frozen = super().freeze()
+        frozen.name = self.name
+        return frozen
+
+    def _frozen_type(self):
+        return FrozenCommunicationNetwork
+
     @classmethod
     def from_json(cls, file_path, name=None):
         file_path = Path(file_path)
@@ -67,3 +569,45 @@ class CommunicationNetwork(TimeVaryingHypergraph):
             timings = {str(chan_id): datetime.fromisoformat(channel['end']) for chan_id, channel in raw_data.items()}
 
         return cls(hedges, timings, name=name)
+
+    def to_json(self, file_path):
+        # Writes the format read by from_json, compressed if the file name ends with .bz2; timings must be datetimes.
+        # Every channel is written in a line of its own, and the compressed file consists of independent bz2
+        # streams, so simulation.streaming can decompress and parse parts of it in parallel.
+        def encode(value):
+            value = json.dumps(value)
+            return value if isinstance(value, bytes) else value.encode('utf-8')
+
+        file_path = Path(file_path)
+        raw_data = b'{\n' + b',\n'.join(encode(str(chan_id)) + b': ' + encode({'participants': list(participants), 'end': self.timings(chan_id).isoformat()})
+                                         for chan_id, participants in self._hedges.items()) + b'\n}'
+        if file_path.suffix == '.bz2':
+            raw_data = b''.join(bz2.compress(raw_data[i:i + BZ2_STREAM_SIZE]) for i in range(0, len(raw_data), BZ2_STREAM_SIZE))
+        file_path.write_bytes(raw_data)
+
+    @classmethod
+    def from_columnar(cls, path, name=None):
+        if name is None:
+            return FrozenCommunicationNetwork.from_columnar(path)
+        return FrozenCommunicationNetwork.from_columnar(path, name=name)
+
+
+class FrozenCommunicationNetwork(FrozenTimeVaryingHypergraph):
+
+    def __init__(self, *args, name=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+
+    def channels(self, participant=None):
+        return self.hyperedges(participant)
+
+    def participants(self, channel=None):
+        return self.vertices(channel)
+
+    def add_channels(self, channels, channel_timings):
+        self.add_hyperedges(channels, channel_timings)
+
+    def pruned(self):
+        pruned, report = super().pruned()
+        pruned.name = self.name
+        return pruned, report
@@ -0,0 +1,322 @@
+from datetime import timedelta, timezone
+from pathlib import Path
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .model import NameTable, to_epoch, to_epoch_delta
+from .minimal_paths import COUNTERS, DistanceType, count_bits
+
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+
+CHUNK_ROWS = 1 << 22
+RESULT_COLUMNS = {'source': np.int32, 'target': np.int32, 'shortest': np.int32, 'fastest': np.int64, 'foremost': np.int64}
+LATEST_START_COLUMNS = {**RESULT_COLUMNS, 'latest_start': np.int64}
+METRICS_COLUMNS = ('source', 'seconds', 'reachable', *COUNTERS, 'representative')
+
+
+def distance_array(distances):
+    # The distances of a source as int64 rows of hops, fastest, foremost and, if given, latest start, in the order
+    # of the targets; distances found on an epoch view (see as_epochs) are converted by numpy as a whole
+    values = list(distances.values())
+    if not values:
+        return np.empty((0, 4), dtype=np.int64)
+    if not isinstance(values[0][1], (int, np.integer)):
+        values = [(distance[0], to_epoch_delta(distance[1]), *(to_epoch(timing) for timing in distance[2:])) for distance in values]
+    return np.array(values, dtype=np.int64)
+
+
+class ResultWriter:
+    # Streams the distances of finished sources into typed columnar chunks <path>/part-<n>.npz: source and
+    # target are codes into the sorted participants, fastest and foremost are int64 (nanoseconds for datetimes).
+    # A chunk only holds complete sources, so memory is bounded by the chunk size plus one source. Every chunk
+    # is written atomically together with the codes of its sources and serves as a checkpoint: with resume=True,
+    # the writer keeps the chunks of an interrupted run and reports their sources as completed. With
+    # latest_starts=True, it also stores the latest start of each pair's paths, which update_all_distances needs.
+
+    def __init__(self, path, communication_network, chunk_rows=CHUNK_ROWS, resume=False, latest_starts=False):  # pylint: disable=too-many-arguments
+        self.path = Path(path)
+        self.participants = tuple(sorted(communication_network.participants()))
+        self.datetimes = communication_network.datetimes
+        self.timezone = communication_network.timezone
+        self.max_epoch = int(np.max(communication_network.epochs)) if len(communication_network.epochs) else None
+        self.num_hedges = len(communication_network.epochs)
+        self.chunk_rows = chunk_rows
+        self.latest_starts = latest_starts
+        self.columns = LATEST_START_COLUMNS if latest_starts else RESULT_COLUMNS
+        self.num_chunks = 0
+        self.num_rows = 0
+        self.completed = set()
+        self._codes = {participant: code for code, participant in enumerate(self.participants)}
+        self._buffer = []
+        self._buffered_rows = 0
+        self._buffered_sources = []
+        content_hash = communication_network.content_hash()
+        if resume and (self.path / 'checkpoint.json').exists():
+            self._restore(content_hash)
+        else:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path.mkdir(parents=True)
+            np.save(self.path / 'participants.npy', NameTable.encode(self.participants))
+            write_json(self.path / 'checkpoint.json', {'content_hash': content_hash, 'num_participants': len(self.participants), 'latest_starts': latest_starts})
+
+    def _restore(self, content_hash):
+        checkpoint = json.loads((self.path / 'checkpoint.json').read_bytes())
+        if checkpoint['content_hash'] != content_hash:
+            raise ValueError(f'Cannot resume {self.path}: it was written for a different network')
+        if checkpoint.get('latest_starts', False) != self.latest_starts:
+            raise ValueError(f'Cannot resume {self.path}: it was written {"with" if self.latest_starts else "without"} latest starts')
+        (self.path / 'metadata.json').unlink(missing_ok=True)
+        for partial_path in self.path.glob('*.partial'):
+            partial_path.unlink()
+        while (self.path / f'part-{self.num_chunks:05d}.npz').exists():
+            with np.load(self.path / f'part-{self.num_chunks:05d}.npz') as chunk:
+                self.completed.update(self.participants[code] for code in chunk['sources'])
+                self.num_rows += len(chunk['target'])
+            self.num_chunks += 1
+        # metrics are appended once a task finishes, before its sources are written; keep those of written sources
+        metrics_path = self.path / 'metrics.csv'
+        if metrics_path.exists():
+            metrics = pd.read_csv(metrics_path, dtype={'source': str})
+            metrics[metrics.source.isin({str(participant) for participant in self.completed})].to_csv(metrics_path.with_suffix('.partial'), index=False)
+            metrics_path.with_suffix('.partial').replace(metrics_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # after a failure, the finished sources are still checkpointed, but the result is not marked complete
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.flush()
+
+    def append(self, source, distances):
+        count = len(distances)
+        if self._buffered_rows + count > self.chunk_rows:
+            self.flush()
+        values = distance_array(distances)
+        columns = [np.full(count, self._codes[source], dtype=RESULT_COLUMNS['source']),
+                   np.fromiter((self._codes[target] for target in distances), dtype=RESULT_COLUMNS['target'], count=count),
+                   values[:, 0].astype(RESULT_COLUMNS['shortest']), values[:, 1], values[:, 2]]
+        if self.latest_starts:
+            columns += [values[:, 3]]
+        self._buffer.append(columns)
+        self._buffered_rows += count
+        self._buffered_sources.append(self._codes[source])
+
+    def flush(self):
+        if not self._buffered_sources:
+            return
+        columns = {name: np.concatenate(arrays) for name, arrays in zip(self.columns, zip(*self._buffer))}
+        chunk_path = self.path / f'part-{self.num_chunks:05d}.npz'
+        partial_path = chunk_path.with_suffix('.partial')
+        with open(partial_path, 'wb') as file:
+            np.savez(file, sources=np.array(self._buffered_sources, dtype=RESULT_COLUMNS['source']), **columns)
+            file.flush()
+            os.fsync(file.fileno())
+        partial_path.replace(chunk_path)
+        self.completed.update(self.participants[code] for code in self._buffered_sources)
+        self.num_chunks += 1
+        self.num_rows += self._buffered_rows
+        self._buffer = []
+        self._buffered_rows = 0
+        self._buffered_sources = []
+
+    def close(self):
+        self.flush()
+        # the metadata is written last and marks the result as complete
+        write_json(self.path / 'metadata.json', {
+            'num_participants': len(self.participants),
+            'num_chunks': self.num_chunks,
+            'num_rows': self.num_rows,
+            'datetimes': self.datetimes,
+            'utc_offset': None if self.timezone is None else self.timezone.utcoffset(None).total_seconds(),
+            'latest_starts': self.latest_starts,
+            'max_epoch': self.max_epoch,
+            'num_hedges': self.num_hedges})
+
+
+def write_json(path, data):
+    data = json.dumps(data)
+    Path(path).write_bytes(data if isinstance(data, bytes) else data.encode('utf-8'))
+
+
+def read_metadata(path):
+    path = Path(path)
+    if not (path / 'metadata.json').exists():
+        raise FileNotFoundError(f'No complete result at {path}')
+    return json.loads((path / 'metadata.json').read_bytes())
+
+
+def read_participants(path):
+    return NameTable(np.load(Path(path) / 'participants.npy'), read_metadata(path)['num_participants'])
+
+
+def read_chunks(path):
+    path = Path(path)
+    for i in range(read_metadata(path)['num_chunks']):
+        with np.load(path / f'part-{i:05d}.npz') as chunk:
+            yield {name: chunk[name] for name in chunk.files if name != 'sources'}
+
+
+def delta_path(path, i):
+    return Path(path) / f'delta-{i:05d}'
+
+
+def result_paths(path):
+    # a result followed by the deltas of its updates, in order
+    return [Path(path), *(delta_path(path, i) for i in range(read_metadata(path).get('num_deltas', 0)))]
+
+
+def write_delta(path, communication_network, distances):
+    # Stores the new or changed distances of an update, e.g. from update_all_distances, as the next delta of
+    # the result at path; the delta refers to the participants of the updated network
+    metadata = read_metadata(path)
+    num_deltas = metadata.get('num_deltas', 0)
+    with ResultWriter(delta_path(path, num_deltas), communication_network, latest_starts=True) as writer:
+        for source, changes in distances:
+            writer.append(source, changes)
+    write_json(Path(path) / 'metadata.json', dict(metadata, num_deltas=num_deltas + 1))
+
+
+def read_columns(path, targets=None):
+    # Columns of the result at path with its deltas applied, as codes into the participants of the latest
+    # delta; with targets, only the rows of these targets are read
+    paths = result_paths(path)
+    participants = read_participants(paths[-1])
+    codes = {participant: code for code, participant in enumerate(participants)}
+    parts = []
+    for result_path in paths:
+        own_participants = read_participants(result_path)
+        recode = np.fromiter((codes[participant] for participant in own_participants), dtype=RESULT_COLUMNS['source'], count=len(own_participants))
+        target_codes = None if targets is None else np.array([code for code, participant in enumerate(own_participants) if participant in targets], dtype=RESULT_COLUMNS['target'])
+        for chunk in read_chunks(result_path):
+            if target_codes is not None:
+                rows = np.isin(chunk['target'], target_codes)
+                chunk = {name: column[rows] for name, column in chunk.items()}
+            if len(paths) > 1:
+                chunk['source'], chunk['target'] = recode[chunk['source']], recode[chunk['target']]
+            parts.append(chunk)
+    names = [name for name in LATEST_START_COLUMNS if all(name in part for part in parts)]
+    columns = {name: np.concatenate([part[name] for part in parts]) if parts else np.empty(0, dtype=LATEST_START_COLUMNS[name]) for name in names}
+    parts = None
+    if len(paths) > 1:
+        # later rows override earlier ones of the same pair
+        keys = columns['source'].astype(np.int64) * len(participants) + columns['target']
+        _, last = np.unique(keys[::-1], return_index=True)
+        rows = np.sort(len(keys) - 1 - last)
+        columns = {name: column[rows] for name, column in columns.items()}
+    return participants, columns
+
+
+def append_metrics(path, metrics):
+    # Appends rows of per-source seconds and work counters, with the representative whose search they measure,
+    # to <path>/metrics.csv, which, like the chunks, survives an interrupted run and is continued on resume
+    metrics_path = Path(path) / 'metrics.csv'
+    pd.DataFrame(metrics, columns=METRICS_COLUMNS).to_csv(metrics_path, mode='a', header=not metrics_path.exists(), index=False)
+
+
+def read_metrics(path):
+    metrics_path = Path(path) / 'metrics.csv'
+    if not metrics_path.exists():
+        return pd.DataFrame(columns=METRICS_COLUMNS).set_index('source')
+    return pd.read_csv(metrics_path, index_col='source')
+
+
+def merge_results(fragment_paths, path):
+    # Joins complete result fragments of disjoint sources, e.g. written by several shards, into one result
+    fragment_paths = [Path(fragment_path) for fragment_path in fragment_paths]
+    fragments = [(fragment_path, read_metadata(fragment_path), json.loads((fragment_path / 'checkpoint.json').read_bytes())) for fragment_path in fragment_paths]
+    if len({checkpoint['content_hash'] for _, _, checkpoint in fragments}) > 1:
+        raise ValueError('Cannot merge result fragments of different networks')
+    path = Path(path)
+    partial_path = path.with_suffix('.partial')
+    shutil.rmtree(partial_path, ignore_errors=True)
+    partial_path.mkdir(parents=True)
+    for file_name in ('participants.npy', 'checkpoint.json'):
+        shutil.copyfile(fragment_paths[0] / file_name, partial_path / file_name)
+    sources = []
+    num_chunks = 0
+    for fragment_path, metadata, _ in fragments:
+        for i in range(metadata['num_chunks']):
+            with np.load(fragment_path / f'part-{i:05d}.npz') as chunk:
+                sources.append(chunk['sources'])
+            shutil.copyfile(fragment_path / f'part-{i:05d}.npz', partial_path / f'part-{num_chunks:05d}.npz')
+            num_chunks += 1
+        if (fragment_path / 'metrics.csv').exists():
+            append_metrics(partial_path, read_metrics(fragment_path).reset_index())
+    sources = np.concatenate(sources) if sources else np.empty(0, dtype=RESULT_COLUMNS['source'])
+    metadata = fragments[0][1]
+    if len(sources) != metadata['num_participants'] or len(np.unique(sources)) != len(sources):
+        shutil.rmtree(partial_path)
+        raise ValueError('The result fragments do not cover every participant exactly once')
+    write_json(partial_path / 'metadata.json', dict(metadata, num_chunks=num_chunks, num_rows=sum(fragment_metadata['num_rows'] for _, fragment_metadata, _ in fragments)))
+    shutil.rmtree(path, ignore_errors=True)
+    partial_path.rename(path)
+
+
+def timing_columns(metadata, fastest, foremost):
+    # Epoch columns of a result as timedelta and datetime columns if its network has datetime timings
+    if not metadata['datetimes']:
+        return fastest, foremost
+    if metadata['utc_offset'] is None:
+        return pd.to_timedelta(fastest, unit='ns'), pd.to_datetime(foremost, unit='ns')
+    return pd.to_timedelta(fastest, unit='ns'), pd.to_datetime(foremost, unit='ns', utc=True).tz_convert(timezone(timedelta(seconds=metadata['utc_offset'])))
+
+
+def to_frame(path):
+    # Rebuilds the published data frame: categorical source/target index, int hops, and timedelta/datetime
+    # columns for networks with datetime timings
+    metadata = read_metadata(result_paths(path)[-1])
+    participants, columns = read_columns(path)
+    category = pd.api.types.CategoricalDtype(categories=tuple(participants), ordered=False)
+    fastest, foremost = timing_columns(metadata, columns['fastest'], columns['foremost'])
+    result = pd.DataFrame({'source': pd.Categorical.from_codes(columns['source'], dtype=category),
+                           'target': pd.Categorical.from_codes(columns['target'], dtype=category),
+                           'shortest': columns['shortest'].astype(np.int64), 'fastest': fastest, 'foremost': foremost})
+    columns = None
+    # sorting and joining the columns separately, as in the published results, keeps the pickle byte-identical
+    distance_type_names = [distance_type.name.lower() for distance_type in DistanceType]
+    result = result.set_index(['source', 'target'])
+    return pd.concat([result[column].sort_index() for column in distance_type_names], axis=1).sort_index()
+
+
+def export_results(path, result_dir_path, name):
+    result = to_frame(path)
+    result.info(verbose=True, memory_usage=True, show_counts=True)
+    result.to_csv(Path(result_dir_path) / f'{name}.csv.bz2', compression='bz2')
+    result.to_pickle(Path(result_dir_path) / f'{name}.pickle.bz2', compression='bz2')
+    if (Path(path) / 'metrics.csv').exists():
+        shutil.copyfile(Path(path) / 'metrics.csv', Path(result_dir_path) / f'{name}.metrics.csv')
+
+
+def export_reachability(result_dir_path, name, participants, blocks, matrix=False):
+    # Counts of the participants each participant reaches, and optionally the matrix of packed bits (little bit
+    # order) with rows and columns in the order of the participants, written block by block to a memory map
+    counts = np.zeros(len(participants), dtype=np.int64)
+    matrix_path = Path(result_dir_path) / f'{name}.reachability.npy'
+    bits = np.lib.format.open_memmap(matrix_path.with_suffix('.partial'), mode='w+', dtype=np.uint8, shape=(len(participants), (len(participants) + 7) // 8)) if matrix else None
+    column = 0
+    for targets, reached in blocks:
+        if bits is not None:
+            if column % 8:
+                raise ValueError('Blocks of targets must be a multiple of 8 long')
+            bits[:, column // 8:column // 8 + reached.shape[1]] = reached
+        counts += count_bits(reached)
+        column += len(targets)
+    if bits is not None:
+        bits.flush()
+        del bits
+        os.replace(matrix_path.with_suffix('.partial'), matrix_path)
+    category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
+    result = pd.DataFrame({'reachable': counts}, index=pd.Index(pd.Categorical(participants, dtype=category), name='source'))
+    result.to_csv(Path(result_dir_path) / f'{name}.reachability.csv.bz2', compression='bz2')
+    result.to_pickle(Path(result_dir_path) / f'{name}.reachability.pickle.bz2', compression='bz2')
+    return result
@@ -1,69 +1,566 @@
 import argparse
+import hashlib
+import heapq
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from datetime import timedelta
 from pathlib import Path
 import multiprocessing as mp
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import cProfile
 
-
-import pandas as pd
+import numpy as np
 from tqdm import tqdm
 
-from .model import CommunicationNetwork
-from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, DistanceType
+from .model import CommunicationNetwork, to_epoch, to_epoch_delta
+from .minimal_paths import (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, single_source_all_distances, single_source_all_distances_until, update_all_distances,
+                            all_pairs_foremost, all_pairs_shortest, all_pairs_reachability, single_source_successor_dag, take_counters, DistanceType)
+from .sampling import SampleEstimator, sample_sources
+from .streaming import read_network
+from .store import ResultStore, build_store, serve
+from .results import ResultWriter, append_metrics, export_reachability, export_results, merge_results, read_columns, read_metadata, result_paths, write_delta
 
 AVAILABLE_DATA_SETS = ('microsoft', )  # other data sets have not been published yet
+NETWORK_DIR_PATH = Path('./data/networks/')
+BLOCK_SIZE = 256
+MAX_CHUNK_SIZE = 256
+TASKS_PER_WORKER = 32
+
+_worker_networks = {}
+_worker_windows = {}
+_worker_profile = {}
+
+
+def attach_networks(networks, profile_dir=None):
+    # Worker initializer: columnar networks unpickle by memory-mapping their files, so every worker attaches
+    # to the same pages once and tasks only carry network names and source IDs. Workers search on epoch views,
+    # so the distances stay int64 epochs until the export converts whole columns.
+    _worker_networks.update({name: network.as_epochs() for name, network in networks.items()})
+    if profile_dir is not None:
+        _worker_profile['profile'] = cProfile.Profile()
+        _worker_profile['path'] = Path(profile_dir)/f'worker-{os.getpid()}.prof'
+
+
+def worker_pool(num_processes, networks, profile_dir=None):
+    return ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=num_processes, initializer=attach_networks, initargs=(networks, profile_dir))
+
+
+def profiled(function, *args):
+    # Runs a task in a worker, under the worker's profiler if there is one. Workers are shut down without notice,
+    # so the stats are dumped after every task.
+    if not _worker_profile:
+        return function(*args)
+    _worker_profile['profile'].enable()
+    try:
+        return function(*args)
+    finally:
+        _worker_profile['profile'].disable()
+        _worker_profile['profile'].dump_stats(_worker_profile['path'])
+
+
+def write_profile(profile, profile_dir, path, top=30):
+    # Merges the stats of the parent process and of all workers into one file and prints the top functions
+    stats = pstats.Stats(profile)
+    for worker_path in sorted(Path(profile_dir).glob('worker-*.prof')):
+        stats.add(str(worker_path))
+    stats.dump_stats(path)
+    stats.sort_stats('cumulative').print_stats(top)
+
+
+def schedule(participants, costs, engine, num_workers):
+    # Tasks are submitted largest first, so the expensive sources do not stall the tail of the run. Sources are
+    # batched until a task reaches a fair share of the total cost: expensive sources run alone, cheap ones share
+    # a chunk to amortize the task overhead. The batched engine handles a whole block of sources per task.
+    participants = sorted(participants, key=lambda participant: (-costs[participant], participant))
+    if engine == 'bitset_bfs':
+        return [tuple(participants[i:i + BLOCK_SIZE]) for i in range(0, len(participants), BLOCK_SIZE)]
+    task_cost = sum(costs[participant] + 1 for participant in participants) / (num_workers * TASKS_PER_WORKER)
+    tasks, task, cost = [], [], 0
+    for participant in participants:
+        task.append(participant)
+        cost += costs[participant] + 1
+        if cost >= task_cost or len(task) == MAX_CHUNK_SIZE:
+            tasks.append(tuple(task))
+            task, cost = [], 0
+    if task:
+        tasks.append(tuple(task))
+    return tasks
+
+
+def source_costs(communication_network):
+    # Upper bound of the work per source: the number of channels at or after its first channel, which bounds
+    # the channels and thereby the participants it can reach
+    epochs = np.sort(communication_network.epochs)
+    offsets = np.asarray(communication_network.vertex_offsets)
+    vertex_epochs = np.asarray(communication_network.vertex_epochs)
+    costs = np.zeros(len(offsets) - 1, dtype=np.int64)
+    active = np.flatnonzero(np.diff(offsets))
+    costs[active] = len(epochs) - np.searchsorted(epochs, vertex_epochs[offsets[active]])
+    return dict(zip(communication_network.vertex_names, costs.tolist()))
+
+
+def shard_participants(communication_network, num_shards):
+    # Deterministic cost-balanced partition: the most expensive participants first, each to the least loaded shard
+    costs = source_costs(communication_network)
+    loads = [(0, shard) for shard in range(num_shards)]
+    shards = [[] for _ in range(num_shards)]
+    for participant in sorted(costs, key=lambda participant: (-costs[participant], participant)):
+        load, shard = heapq.heappop(loads)
+        shards[shard].append(participant)
+        heapq.heappush(loads, (load + costs[participant] + 1, shard))
+    return [tuple(sorted(shard)) for shard in shards]
+
+
+def shard_path(result_dir_path, name, shard, num_shards):
+    return result_dir_path/f'{name}.shard-{shard}-of-{num_shards}.chunks'
+
 
+def parse_shard(value):
+    try:
+        shard, num_shards = (int(part) for part in value.split('/'))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f'{value!r} is not of the form i/N') from error
+    if not 0 <= shard < num_shards:
+        raise argparse.ArgumentTypeError(f'Shard {shard} is not in 0..{num_shards - 1}')
+    return shard, num_shards
+
+
+def single_source_distances(communication_network, source, engine):
+    match engine:
+        case 'hyperedge_dijkstra':
+            return [single_source_dijkstra_hyperedges(communication_network, source, distance_type) for distance_type in DistanceType]
+        case 'vertex_dijkstra':
+            return [single_source_dijkstra_vertices(communication_network, source, distance_type) for distance_type in DistanceType]
+        case 'successor_dag':
+            return [single_source_successor_dag(communication_network, source, distance_type,
+                                                dag=communication_network.successor_dag(reduced=distance_type is not DistanceType.SHORTEST, cache_dir=NETWORK_DIR_PATH))
+                    for distance_type in DistanceType]
+
+
+def all_distances(name, sources, engine, metrics=None):
+    # With a metrics list, appends the seconds and the work counters of each source to it; the batched part of
+    # the bitset engine is shared by the block and not attributed to its sources
+    communication_network = _worker_networks[name]
+    if engine == 'bitset_bfs':
+        shortest_blocks = dict(all_pairs_shortest(communication_network, sources, block_size=BLOCK_SIZE))
+        foremost_blocks = dict(all_pairs_foremost(communication_network, sources, block_size=BLOCK_SIZE))
+    result = []
+    for source in sources:
+        take_counters()
+        start = time.perf_counter()
+        if engine == 'single_traversal':
+            distances = single_source_all_distances(communication_network, source, latest_starts=True)
+        else:
+            if engine == 'bitset_bfs':
+                shortest, fastest, foremost = shortest_blocks[source], single_source_dijkstra_hyperedges(communication_network, source, DistanceType.FASTEST), foremost_blocks[source]
+            else:
+                shortest, fastest, foremost = single_source_distances(communication_network, source, engine)
+            distances = {target: (shortest[target], fastest[target], foremost[target]) for target in shortest}
+        if metrics is not None:
+            metrics.append((source, time.perf_counter() - start, len(distances), *take_counters().values()))
+        result.append((source, distances))
+    return result
+
+
+def timed_all_distances(name, sources, engine):
+    start = time.perf_counter()
+    metrics = []
+    distances = all_distances(name, sources, engine, metrics)
+    return os.getpid(), time.perf_counter() - start, distances, metrics
+
+
+def report_utilization(name, busy_times, wall_time, num_workers):
+    # Busy time per worker relative to the wall time of the network; ideally, the wall time is the total busy
+    # time divided by the number of workers
+    total = sum(busy for busy, _ in busy_times.values())
+    print(f'Worker utilization at {name.capitalize()}: {wall_time:.1f} s wall time, {total:.1f} s busy in {num_workers} workers'
+          f' ({100 * total / max(wall_time * num_workers, 1e-9):.1f} %)')
+    for pid, (busy, num_tasks) in sorted(busy_times.items()):
+        print(f'  worker {pid}: {num_tasks} tasks, {busy:.1f} s busy ({100 * busy / max(wall_time, 1e-9):.1f} %)')
+
+
+def update_results(communication_network, name, path):
+    # Continues the result at path with the channels added to the network since, which must all be later than
+    # the others, and stores the new or changed distances as a delta
+    metadata = read_metadata(result_paths(path)[-1])
+    if not metadata.get('latest_starts'):
+        raise ValueError(f'{path} has no latest starts to continue; rerun the simulation with --single_traversal')
+    epochs = np.asarray(communication_network.epochs)
+    new_epochs = epochs[epochs > metadata['max_epoch']]
+    if len(epochs) - len(new_epochs) != metadata['num_hedges']:
+        raise ValueError(f'The network {name} does not extend the one of {path}: new channels must be later than all others')
+    if new_epochs.size == 0:
+        print(f'No new channels at {name.capitalize()}')
+        return
+    tail_vertices = {participant for hedge in np.flatnonzero(epochs > metadata['max_epoch']) for participant in communication_network.vertices(communication_network.hedge_names[hedge])}
+    participants, columns = read_columns(path, targets=tail_vertices)
+    previous = defaultdict(dict)
+    for source, target, shortest, fastest, foremost, latest_start in zip(*(columns[column].tolist() for column in ('source', 'target', 'shortest', 'fastest', 'foremost', 'latest_start'))):
+        previous[participants[source]][participants[target]] = (shortest, fastest, foremost, latest_start)
+    columns = None
+    updates = update_all_distances(communication_network.as_epochs(), previous, int(new_epochs.min()))
+    write_delta(path, communication_network, tqdm(updates, desc=f'Update distances at {name.capitalize()}'.ljust(36)))
+
+
+def sample_name(name, k, seed, strata):
+    return f'{name}.sample-{k}-seed-{seed}' + (f'-strata-{strata}' if strata > 1 else '')
+
+
+def simulate_sample(executor, communication_network, name, engine, sample, stratum_sizes, path, tolerance=None):  # pylint: disable=too-many-arguments,too-many-locals
+    # Sources are submitted in the random order of the sample, and the estimates only use the longest completed
+    # prefix of it, which is a random sample itself no matter which sources finish first. The estimates are refined
+    # as the prefix grows; with a tolerance, the run stops once no confidence interval is wider than it (in ranks).
+    estimator = SampleEstimator(communication_network, stratum_sizes)
+    refresh = max(1, len(sample) // 50)
+    completed, refreshed = {}, 0
+    with ResultWriter(path, communication_network, latest_starts=engine == 'single_traversal') as writer, tqdm(total=len(sample), desc=f'Sample distances at {name.capitalize()}'.ljust(36)) as progress:
+        futures = {executor.submit(profiled, timed_all_distances, name, (source, ), engine): source for source, _ in sample}
+        for future in as_completed(futures):
+            if future.exception():
+                raise future.exception()
+            _, _, result, metrics = future.result()
+            for source, distances in result:
+                writer.append(source, distances)
+                completed[source] = distances
+            append_metrics(path, [(*row, row[0]) for row in metrics])
+            progress.update(1)
+            while len(estimator) < len(sample) and sample[len(estimator)][0] in completed:
+                source, stratum = sample[len(estimator)]
+                estimator.add(stratum, completed.pop(source))
+            if not estimator.ready() or (len(estimator) < refreshed + refresh and len(estimator) < len(sample)):
+                continue
+            refreshed = len(estimator)
+            half_width = estimator.estimates().half_width.max()
+            progress.set_postfix(sources=len(estimator), half_width=f'{half_width:.4f}')
+            if tolerance is not None and half_width <= tolerance:
+                for pending in futures:
+                    pending.cancel()
+                break
+    if not estimator.ready():
+        print(f'Too few sampled sources at {name.capitalize()} to estimate')
+        return None
+    estimates = estimator.estimates()
+    print(f'Estimates from {len(estimator)} sampled sources at {name.capitalize()}:')
+    print(estimates.to_string())
+    estimates.to_csv(path.with_name(path.name.removesuffix('.chunks') + '.estimates.csv'))
+    return estimates
+
+
+def reachability_results(communication_network, name, result_dir_path, matrix=False):
+    participants = sorted(communication_network.participants())
+    blocks = all_pairs_reachability(communication_network, participants)
+    with tqdm(total=len(participants), desc=f'Find reachable sets at {name.capitalize()}'.ljust(36)) as progress:
+        export_reachability(result_dir_path, name, participants, (progress.update(len(targets)) or (targets, reached) for targets, reached in blocks), matrix=matrix)
+
+
+def window_bounds(communication_network, step, size=None):
+    # Windows [start, start + size) every step from the first channel, which is rounded down to midnight for
+    # datetime timings, or growing windows from the first channel without a size; steps and sizes are in days
+    # for datetime timings. Returns the ascending ends of the windows per start.
+    epochs = np.asarray(communication_network.epochs)
+    first, last = int(epochs.min()), int(epochs.max())
+    if communication_network.datetimes:
+        first = to_epoch(communication_network.to_timing(first).replace(hour=0, minute=0, second=0, microsecond=0))
+        step, size = to_epoch_delta(timedelta(days=step)), None if size is None else to_epoch_delta(timedelta(days=size))
+    elif any(value is not None and not float(value).is_integer() for value in (step, size)):
+        raise ValueError(f'Window steps and sizes of integer timings must be whole numbers, got step {step} and size {size}')
+    else:
+        step, size = int(step), None if size is None else int(size)
+    if step <= 0 or (size is not None and size <= 0):
+        raise ValueError('Window steps and sizes must be positive')
+    if size is None:
+        return {first: [first + k * step for k in range(1, (last - first) // step + 2)]}
+    return {start: [start + size] for start in range(first, last + 1, step)}
 
-def run_simulation():
+
+def window_path(result_dir_path, communication_network, name, start, end):
+    if communication_network.datetimes:
+        start, end = (f'{communication_network.to_timing(epoch):%Y%m%dT%H%M}' for epoch in (start, end))
+    return result_dir_path/f'{name}.window-{start}-{end}.chunks'
+
+
+def window_distances(name, sources, start, ends):
+    # The traversal of a source in the window of the latest end yields the distances of all windows with its start
+    communication_network = _worker_networks[name]
+    if (name, start, ends[-1]) not in _worker_windows:
+        _worker_windows.clear()
+        _worker_windows[name, start, ends[-1]] = communication_network.window(communication_network.to_timing(start), communication_network.to_timing(ends[-1]))
+    window = _worker_windows[name, start, ends[-1]]
+    end_timings = [communication_network.to_timing(end) for end in ends]
+    return [(source, list(single_source_all_distances_until(window, source, end_timings))) for source in sources]
+
+
+def simulate_windows(executor, num_workers, communication_network, name, windows, result_dir_path, export=True):  # pylint: disable=too-many-arguments,too-many-locals
+    # Tasks are submitted in the order of the window starts; the results of a start are complete, and exported,
+    # once all of its tasks are done
+    def open_writers(start):
+        return [ResultWriter(window_path(result_dir_path, communication_network, name, start, end), communication_network) for end in windows[start]]
+
+    def close_writers(writers):
+        for writer in writers:
+            writer.close()
+            if export:
+                export_results(writer.path, result_dir_path, writer.path.name.removesuffix('.chunks'))
+
+    costs = source_costs(communication_network)
+    futures, pending, writers = {}, {}, {}
+    for start, ends in windows.items():
+        participants = communication_network.window(communication_network.to_timing(start), communication_network.to_timing(ends[-1])).participants()
+        tasks = schedule(participants, costs, 'single_traversal', num_workers)
+        if not tasks:
+            close_writers(open_writers(start))
+        futures.update({executor.submit(profiled, window_distances, name, task, start, ends): (start, task) for task in tasks})
+        pending[start] = len(tasks)
+    with tqdm(total=sum(len(task) for _, task in futures.values()), desc=f'Find window distances at {name.capitalize()}'.ljust(36)) as progress:
+        for future in as_completed(futures):
+            if future.exception():
+                raise future.exception()
+            start, task = futures.pop(future)
+            if start not in writers:
+                writers[start] = open_writers(start)
+            for source, distances in future.result():
+                for writer, distances_until_end in zip(writers[start], distances):
+                    writer.append(source, distances_until_end)
+            progress.update(len(task))
+            pending[start] -= 1
+            if pending[start] == 0:
+                close_writers(writers.pop(start))
+
+
+def load_network(name):
+    # The network is converted once into a columnar directory keyed by the content hash of its JSON file.
+    # Loading it memory-maps the arrays, so worker processes attach to it instead of unpickling a copy.
+    json_path = NETWORK_DIR_PATH/f'{name}.json.bz2'
+    columnar_path = NETWORK_DIR_PATH/f'{name}.{hashlib.sha256(json_path.read_bytes()).hexdigest()[:16]}.columnar'
+    if not columnar_path.exists():
+        partial_path = columnar_path.with_suffix('.partial')
+        shutil.rmtree(partial_path, ignore_errors=True)
+        read_network(json_path, name=name).to_columnar(partial_path)
+        partial_path.rename(columnar_path)
+    return CommunicationNetwork.from_columnar(columnar_path, name=name)
+
+
+def prune_network(communication_network, name):
+    # The network without the channels that cannot improve any distance, which the workers search instead; it is
+    # cached next to the network with a report of what was pruned (see FrozenTimeVaryingHypergraph.pruned)
+    pruned_path = NETWORK_DIR_PATH/f'{name}.{communication_network.content_hash()[:16]}.pruned'
+    if not pruned_path.exists():
+        partial_path = pruned_path.with_suffix('.pruned-partial')
+        shutil.rmtree(partial_path, ignore_errors=True)
+        pruned, report = communication_network.pruned()
+        report['classes'] = len(np.unique(pruned.vertex_classes()))
+        pruned.to_columnar(partial_path)
+        (partial_path/'pruning.json').write_text(json.dumps(report), encoding='utf-8')
+        partial_path.rename(pruned_path)
+    report = json.loads((pruned_path/'pruning.json').read_text(encoding='utf-8'))
+    print(f'Pruned {report["small"] + report["concurrent_subsets"]} of {report["hedges"]} channels at {name.capitalize()} ({report["small"]} with fewer than two participants, '
+          f'{report["concurrent_subsets"]} within a channel of the same timing); {len(communication_network.vertex_names)} participants have {report["classes"]} distinct sets of channels')
+    return CommunicationNetwork.from_columnar(pruned_path, name=name)
+
+
+def participant_classes(communication_network, participants):
+    # Participants grouped by the representative of their class of participants with the same channels, which
+    # is searched for all of them
+    representatives = communication_network.vertex_classes()
+    classes = defaultdict(list)
+    for participant in participants:
+        classes[communication_network.vertex_names[representatives[communication_network.vertex_id(participant)]]].append(participant)
+    return classes
+
+
+def class_distances(distances, representative, participant):
+    # A participant of the representative's class reaches the others like the representative, and the
+    # representative like the representative reaches it
+    if participant == representative:
+        return distances
+    return {representative if target == participant else target: distance for target, distance in distances.items()}
+
+
+def run_simulation():  # pylint: disable=too-many-statements
     parser = argparse.ArgumentParser(description='Simulating information diffusion in code review communication networks')
     parser.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Load a subset of the available data', default=AVAILABLE_DATA_SETS)
     parser.add_argument('--num_processes', type=int, default=mp.cpu_count(), help='Number of parallel processes (default # of CPUs)')
 
     group = parser.add_mutually_exclusive_group()
-    group.add_argument('--hyperedge_dijkstra', action='store_false', help='Use single-source Dikstra algorithm via hyperedges; tend to be faster than --vertex_dijkstra (default)')
-    group.add_argument('--vertex_dijkstra', action='store_true', help='Use single-source Dikstra algorithm via vertices')
+    group.add_argument('--single_traversal', dest='engine', action='store_const', const='single_traversal', help='Find all three distances of a source in one chronological traversal (default)')
+    group.add_argument('--hyperedge_dijkstra', dest='engine', action='store_const', const='hyperedge_dijkstra', help='Use single-source Dikstra algorithm via hyperedges; tend to be faster than --vertex_dijkstra')
+    group.add_argument('--vertex_dijkstra', dest='engine', action='store_const', const='vertex_dijkstra', help='Use single-source Dikstra algorithm via vertices')
+    group.add_argument('--bitset_bfs', dest='engine', action='store_const', const='bitset_bfs',
+                       help=f'Use a BFS and a chronological sweep over packed bitsets of {BLOCK_SIZE} sources at once for shortest and foremost distances; fastest distances use --hyperedge_dijkstra')
+    group.add_argument('--successor_dag', dest='engine', action='store_const', const='successor_dag',
+                       help='Use dynamic programming in topological order over the hyperedge successor DAG, cached next to the network; the full DAG needed for shortest distances may be large')
+    parser.set_defaults(engine='single_traversal')
+
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N', help='Only simulate the i-th of N cost-balanced parts of the participants (0 <= i < N) into a result fragment; join the fragments with the merge command')
+    parser.add_argument('--resume', action='store_true', help='Keep the checkpointed results of an interrupted run and only simulate the remaining participants')
+
+    parser.add_argument('--sample', type=int, metavar='k', help='Only simulate k random sources and estimate quantiles of the reach and distances with confidence intervals')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random sample (default 0)')
+    parser.add_argument('--strata', type=int, default=1, help='Stratify the sample by degree into this many strata of equal size (default 1, i.e., no stratification)')
+    parser.add_argument('--tolerance', type=float, help='Stop sampling once no confidence interval is wider than this share of the ranks, e.g., 0.02')
+
+    export = parser.add_mutually_exclusive_group()
+    export.add_argument('--no_export', action='store_true', help='Only write the chunked results to data/minimal_paths/<name>.chunks; export them later with --export_only')
+    export.add_argument('--export_only', action='store_true', help='Export existing chunked results to CSV and pickle without running the simulation')
+    parser.add_argument('--no_prune', action='store_true', help='Search the whole networks instead of pruning the channels that cannot improve any distance; the results are the same')
+    parser.add_argument('--profile', type=Path, metavar='PATH', help='Profile the parent and all worker processes and write the merged cProfile stats to PATH, e.g., simulation.prof')
+
+    commands = parser.add_subparsers(dest='command')
+    merge = commands.add_parser('merge', help='Join the result fragments of all shards and export them')
+    merge.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Merge a subset of the available data', default=AVAILABLE_DATA_SETS)
+    merge.add_argument('--shards', type=int, required=True, help='Number of shards N the simulation was split into')
+    update = commands.add_parser('update', help='Continue existing results with the channels added to the networks since, which must be later than all others')
+    update.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Update a subset of the available data', default=AVAILABLE_DATA_SETS)
+    update.add_argument('--no_export', action='store_true', help='Only store the changes as a delta of data/minimal_paths/<name>.chunks')
+    reachability = commands.add_parser('reachability', help='Only count the participants each participant reaches into data/minimal_paths/<name>.reachability')
+    reachability.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Load a subset of the available data', default=AVAILABLE_DATA_SETS)
+    reachability.add_argument('--no_prune', action='store_true', help='Search the whole networks instead of pruning the channels that cannot improve any distance')
+    reachability.add_argument('--matrix', action='store_true', help='Also store the full reachability matrix as packed bits in data/minimal_paths/<name>.reachability.npy')
+    windows = commands.add_parser('windows', help='Find all distances within time windows of the networks, each into data/minimal_paths/<name>.window-<start>-<end>')
+    windows.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Load a subset of the available data', default=AVAILABLE_DATA_SETS)
+    windows.add_argument('--num_processes', type=int, default=mp.cpu_count(), help='Number of parallel processes (default # of CPUs)')
+    windows.add_argument('--step', type=float, required=True, help='Days between the starts of sliding windows, or between the ends of growing windows; a whole number of timing units for integer timings')
+    windows.add_argument('--size', type=float, help='Days covered by a sliding window, or timing units for integer timings; without a size, the windows grow from the first channel by step')
+    windows.add_argument('--no_export', action='store_true', help='Only write the chunked results of the windows')
+    windows.add_argument('--no_prune', action='store_true', help='Search the whole networks instead of pruning the channels that cannot improve any distance')
+
+    store = commands.add_parser('store', help='Index the results for queries into data/minimal_paths/<name>.store')
+    store.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Index a subset of the available data', default=AVAILABLE_DATA_SETS)
+    serve_command = commands.add_parser('serve', help='Answer queries of the indexed results over HTTP')
+    serve_command.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Serve a subset of the available data', default=AVAILABLE_DATA_SETS)
+    serve_command.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default 127.0.0.1, i.e., only local connections)')
+    serve_command.add_argument('--port', type=int, default=8000, help='Port to listen on (default 8000)')
 
     args = parser.parse_args()
+    if args.command is None and args.sample is not None and (args.shard is not None or args.resume or args.export_only):
+        parser.error('--sample cannot be combined with --shard, --resume or --export_only')
+
+    if args.profile is None:
+        run_command(args)
+        return
+    with tempfile.TemporaryDirectory() as profile_dir:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            run_command(args, profile_dir)
+        finally:
+            profile.disable()
+            write_profile(profile, profile_dir, args.profile)
+
 
+def search_networks(communication_networks, no_prune=False):
+    return communication_networks if no_prune else {name: prune_network(communication_network, name) for name, communication_network in communication_networks.items()}
+
+
+def run_command(args, profile_dir=None):  # pylint: disable=too-many-branches,too-many-statements,too-many-return-statements
     result_dir_path = Path('./data/minimal_paths/')
     result_dir_path.mkdir(parents=True, exist_ok=True)
 
-    if args.hyperedge_dijkstra:
-        single_source_dijkstra = single_source_dijkstra_hyperedges
-    else:
-        single_source_dijkstra = single_source_dijkstra_vertices
-
-    for name in args.select:
-        communication_network = CommunicationNetwork.from_json(f'./data/networks/{name}.json.bz2', name=name)
-
-        participants = tuple(sorted(communication_network.participants()))
-        category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
-        data_frames = []
-        for distance_type in DistanceType:
-            distance_type_name = distance_type.name.lower()
-            min_distances = []
-            with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=9) as executor:
-                futures = {executor.submit(
-                    single_source_dijkstra, communication_network, p, distance_type): p for p in participants}
-                for future in tqdm(as_completed(futures), total=len(futures), desc=f'Find all {distance_type_name} distances at {name.capitalize()}'.ljust(36)):
-                    source = futures[future]
-                    if future.exception():
-                        raise future.exception()
-                    for target, distance in future.result().items():
-                        min_distances += [(source, target, distance)]
-            min_distances_df = pd.DataFrame(
-                min_distances, columns=['source', 'target', 'distance'])
-            min_distances = None
-            min_distances_df.source = min_distances_df.source.astype(
-                category)
-            min_distances_df.target = min_distances_df.target.astype(
-                category)
-            data_frames += [min_distances_df.set_index(['source', 'target']).distance.rename(distance_type_name).sort_index()]
-        result = pd.concat(data_frames, axis=1).sort_index()
-        result.info(verbose=True, memory_usage=True, show_counts=True)
-        result.to_csv(result_dir_path/f'{name}.csv.bz2', compression='bz2')
-        result.to_pickle(result_dir_path/f'{name}.pickle.bz2', compression='bz2')
+    if args.command == 'merge':
+        for name in args.select:
+            merge_results([shard_path(result_dir_path, name, shard, args.shards) for shard in range(args.shards)], result_dir_path/f'{name}.chunks')
+            export_results(result_dir_path/f'{name}.chunks', result_dir_path, name)
+        return
+
+    if args.command == 'update':
+        for name in args.select:
+            update_results(load_network(name), name, result_dir_path/f'{name}.chunks')
+            if not args.no_export:
+                export_results(result_dir_path/f'{name}.chunks', result_dir_path, name)
+            if (result_dir_path/f'{name}.store').exists():
+                build_store(result_dir_path/f'{name}.chunks', result_dir_path/f'{name}.store')
+        return
+
+    if args.command == 'store':
+        for name in args.select:
+            build_store(result_dir_path/f'{name}.chunks', result_dir_path/f'{name}.store')
+        return
+
+    if args.command == 'serve':
+        serve({name: ResultStore(result_dir_path/f'{name}.store') for name in args.select}, args.host, args.port)
+        return
+
+    if args.command == 'reachability':
+        for name in args.select:
+            communication_network = load_network(name)
+            reachability_results(communication_network if args.no_prune else prune_network(communication_network, name), name, result_dir_path, matrix=args.matrix)
+        return
+
+    if args.command == 'windows':
+        communication_networks = {name: load_network(name) for name in args.select}
+        windows = {name: window_bounds(communication_network, args.step, args.size) for name, communication_network in communication_networks.items()}
+        with worker_pool(args.num_processes, search_networks(communication_networks, args.no_prune), profile_dir) as executor:
+            for name, communication_network in communication_networks.items():
+                simulate_windows(executor, args.num_processes, communication_network, name, windows[name], result_dir_path, export=not args.no_export)
+        return
+
+    if args.export_only:
+        for name in args.select:
+            export_results(result_dir_path/f'{name}.chunks', result_dir_path, name)
+        return
+
+    communication_networks = {name: load_network(name) for name in args.select}
+    networks = search_networks(communication_networks, args.no_prune)
+    if args.engine == 'successor_dag':
+        for communication_network in networks.values():
+            for reduced in (False, True):
+                communication_network.successor_dag(reduced=reduced, cache_dir=NETWORK_DIR_PATH)
+
+    with worker_pool(args.num_processes, networks, profile_dir) as executor:
+        for name, communication_network in communication_networks.items():
+            if args.sample is not None:
+                sample, stratum_sizes = sample_sources(communication_network, args.sample, seed=args.seed, strata=args.strata)
+                path = result_dir_path/f'{sample_name(name, args.sample, args.seed, args.strata)}.chunks'
+                simulate_sample(executor, communication_network, name, args.engine, sample, stratum_sizes, path, tolerance=args.tolerance)
+                if not args.no_export:
+                    export_results(path, result_dir_path, sample_name(name, args.sample, args.seed, args.strata))
+                continue
+            if args.shard is not None:
+                shard, num_shards = args.shard
+                participants = shard_participants(communication_network, num_shards)[shard]
+                simulate(executor, args.num_processes, communication_network, name, participants, args.engine, shard_path(result_dir_path, name, shard, num_shards), resume=args.resume, search_network=networks[name])
+                continue
+            simulate(executor, args.num_processes, communication_network, name, sorted(communication_network.participants()), args.engine, result_dir_path/f'{name}.chunks', resume=args.resume, search_network=networks[name])
+            if not args.no_export:
+                export_results(result_dir_path/f'{name}.chunks', result_dir_path, name)
+
+
+def simulate(executor, num_workers, communication_network, name, participants, engine, path, resume=False, search_network=None):  # pylint: disable=too-many-arguments,too-many-locals
+    # The workers search the search network, by default the network itself, once per class of participants
+    # with the same channels in it; the results are stored for the network, e.g. for later updates
+    search_network = communication_network if search_network is None else search_network
+    start = time.perf_counter()
+    busy_times = {}
+    with ResultWriter(path, communication_network, resume=resume, latest_starts=engine == 'single_traversal') as writer, \
+         tqdm(total=len(participants), initial=len(writer.completed), desc=f'Find all distances at {name.capitalize()}'.ljust(36)) as progress:
+        resumed = set(writer.completed)
+        pending = [participant for participant in participants if participant not in resumed]
+        classes = participant_classes(search_network, pending)
+        tasks = schedule(classes, source_costs(search_network), engine, num_workers)
+        futures = {executor.submit(profiled, timed_all_distances, name, task, engine): task for task in tasks}
+        for future in as_completed(futures):
+            if future.exception():
+                raise future.exception()
+            pid, busy, result, metrics = future.result()
+            reachable = {}
+            for source, distances in result:
+                for participant in classes[source]:
+                    participant_distances = class_distances(distances, source, participant)
+                    writer.append(participant, participant_distances)
+                    reachable[participant] = len(participant_distances)
+            # every pending participant of a class gets a row with the seconds and counters of the search of its
+            # representative, which is only searched once; a representative completed before is not among them
+            append_metrics(path, [(participant, seconds, reachable[participant], *counters, source) for source, seconds, _, *counters in metrics for participant in classes[source]])
+            busy_time, num_tasks = busy_times.get(pid, (0, 0))
+            busy_times[pid] = (busy_time + busy, num_tasks + 1)
+            progress.update(sum(len(classes[source]) for source in futures.pop(future)))
+    report_utilization(name, busy_times, time.perf_counter() - start, num_workers)
 
 
 if __name__ == '__main__':
-    cProfile.run('run_simulation()', 'outputfile')
+    run_simulation()
@@ -0,0 +1,98 @@
+import random
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from .results import distance_array
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+CONFIDENCE = 0.95
+METRICS = ('reachable', 'shortest', 'fastest', 'foremost')
+
+
+def sample_sources(communication_network, k, seed=0, strata=1):
+    # Random sample of about k participants; with several strata, the participants are split by degree into
+    # strata of equal size, and each stratum gets its proportional share, but at least two. The sample is returned
+    # in random order with the stratum of each source, so every prefix of it is a (stratified) random sample itself.
+    degrees = {participant: len(communication_network.channels(participant)) for participant in communication_network.participants()}
+    participants = sorted(degrees, key=lambda participant: (degrees[participant], participant))
+    if not 1 <= strata <= len(participants) or k < 1:
+        raise ValueError(f'Cannot draw {k} sources from {strata} strata of {len(participants)} participants')
+    bounds = [len(participants) * stratum // strata for stratum in range(strata + 1)]
+    stratum_participants = [participants[start:end] for start, end in zip(bounds, bounds[1:])]
+    rng = random.Random(seed)
+    sample = []
+    for stratum, members in enumerate(stratum_participants):
+        size = min(len(members), max(2, round(k * len(members) / len(participants))))
+        sample += [(participant, stratum) for participant in rng.sample(members, size)]
+    rng.shuffle(sample)
+    return sample, [len(members) for members in stratum_participants]
+
+
+class SampleEstimator:
+    # Estimates quantiles of the reach of sources and of the distances of all source-target pairs from the
+    # distances of the sampled sources. Sources are weighted by the inverse of their stratum's sampling fraction,
+    # so pairs are cluster samples of their sources; the confidence intervals follow Woodruff, i.e., they invert
+    # the interval of the estimated distribution function at the quantile, whose variance is linearized.
+    def __init__(self, communication_network, stratum_sizes):
+        self.communication_network = communication_network
+        self.stratum_sizes = np.asarray(stratum_sizes)
+        self.strata = []
+        self.values = {metric: [] for metric in METRICS}
+
+    def __len__(self):
+        return len(self.strata)
+
+    def add(self, stratum, distances):
+        values = distance_array(distances)
+        self.strata.append(stratum)
+        self.values['reachable'].append(np.array([len(distances)], dtype=np.int64))
+        for i, metric in enumerate(('shortest', 'fastest', 'foremost')):
+            self.values[metric].append(np.sort(values[:, i]))
+
+    def ready(self):
+        counts = np.bincount(self.strata, minlength=len(self.stratum_sizes))
+        return bool(np.all(counts >= np.minimum(2, self.stratum_sizes)))
+
+    def _quantiles(self, values, quantiles, confidence):  # pylint: disable=too-many-locals
+        strata = np.asarray(self.strata)
+        counts = np.bincount(strata, minlength=len(self.stratum_sizes))
+        weights = self.stratum_sizes[strata] / counts[strata]
+        sizes = np.array([len(value) for value in values])
+        pooled = np.concatenate(values)
+        if pooled.size == 0:
+            return [(np.nan, np.nan, np.nan, np.nan)] * len(quantiles)
+        order = np.argsort(pooled, kind='stable')
+        pooled = pooled[order]
+        cumulative = np.cumsum(np.repeat(weights, sizes)[order])
+        cumulative /= cumulative[-1]
+
+        def quantile(p):
+            return pooled[min(np.searchsorted(cumulative, min(max(p, 0), 1)), len(pooled) - 1)]
+
+        # finite population correction and the between-source variance within each stratum
+        corrections = np.where(counts > 1, (1 - counts / self.stratum_sizes) * counts / np.maximum(counts - 1, 1), 0)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        result = []
+        for p in quantiles:
+            estimate = quantile(p)
+            below = np.array([np.searchsorted(value, estimate, side='right') for value in values])
+            ratio = np.sum(weights * below) / np.sum(weights * sizes)
+            linearized = weights * (below - ratio * sizes) / np.sum(weights * sizes)
+            means = np.bincount(strata, weights=linearized, minlength=len(counts)) / np.maximum(counts, 1)
+            variance = np.sum(corrections * np.bincount(strata, weights=(linearized - means[strata]) ** 2, minlength=len(counts)))
+            half_width = z * np.sqrt(variance)
+            result.append((estimate, quantile(p - half_width), quantile(p + half_width), half_width))
+        return result
+
+    def estimates(self, quantiles=QUANTILES, confidence=CONFIDENCE):
+        # Quantiles with the bounds of their confidence intervals, and the half-width of the intervals in ranks
+        to_value = {'reachable': int, 'shortest': int, 'fastest': self.communication_network.to_duration, 'foremost': self.communication_network.to_timing}
+        rows = []
+        for metric in METRICS:
+            for p, (estimate, lower, upper, half_width) in zip(quantiles, self._quantiles(self.values[metric], quantiles, confidence)):
+                bounds = (None, None, None) if np.isnan(half_width) else tuple(to_value[metric](int(value)) for value in (estimate, lower, upper))
+                rows.append((metric, p, *bounds, half_width))
+        result = pd.DataFrame(rows, columns=['metric', 'quantile', 'estimate', 'lower', 'upper', 'half_width'])
+        return result.set_index(['metric', 'quantile'])
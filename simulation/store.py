@@ -0,0 +1,161 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .model import EntityNotFound, NameTable, to_epoch, to_epoch_delta
+from .results import RESULT_COLUMNS, read_chunks, read_columns, read_metadata, read_participants, result_paths, timing_columns, write_json
+
+STORE_COLUMNS = ('target', 'shortest', 'fastest', 'foremost')
+DISTANCE_COLUMNS = ('shortest', 'fastest', 'foremost')
+
+
+def build_store(path, store_path):
+    # Rewrites the result at path, with its deltas applied, into uncompressed columns sorted by source and target
+    # and the offsets of the rows of each source, so queries memory-map the columns and only read the rows of
+    # their source. As chunks hold whole sources, a result without deltas is sorted chunk by chunk into the
+    # memory-mapped columns; the resolved columns of a result with deltas are sorted at once.
+    paths = result_paths(path)
+    metadata = read_metadata(paths[-1])
+    if len(paths) > 1:
+        participants, columns = read_columns(path)
+        chunks = lambda: [columns]  # pylint: disable=unnecessary-lambda-assignment
+    else:
+        participants = read_participants(path)
+        chunks = lambda: read_chunks(path)  # pylint: disable=unnecessary-lambda-assignment
+
+    offsets = np.zeros(len(participants) + 1, dtype=np.int64)
+    for chunk in chunks():
+        offsets[1:] += np.bincount(chunk['source'], minlength=len(participants))
+    offsets = np.cumsum(offsets)
+
+    store_path = Path(store_path)
+    partial_path = store_path.with_suffix('.partial')
+    shutil.rmtree(partial_path, ignore_errors=True)
+    partial_path.mkdir(parents=True)
+    np.save(partial_path / 'participants.npy', NameTable.encode(participants))
+    np.save(partial_path / 'offsets.npy', offsets)
+    stored = {name: np.lib.format.open_memmap(partial_path / f'{name}.npy', mode='w+', dtype=RESULT_COLUMNS[name], shape=(int(offsets[-1]), )) for name in STORE_COLUMNS}
+    for chunk in chunks():
+        order = np.lexsort((chunk['target'], chunk['source']))
+        sources = chunk['source'][order]
+        # the sorted rows of a source go to its offset on
+        starts = np.flatnonzero(np.diff(sources, prepend=-1))
+        rows = offsets[sources] + np.arange(len(sources)) - np.repeat(starts, np.diff(np.append(starts, len(sources))))
+        for name, column in stored.items():
+            column[rows] = chunk[name][order]
+    for column in stored.values():
+        column.flush()
+    stored = None
+    write_json(partial_path / 'metadata.json', {'num_participants': len(participants), 'num_rows': int(offsets[-1]), 'datetimes': metadata['datetimes'], 'utc_offset': metadata['utc_offset']})
+    shutil.rmtree(store_path, ignore_errors=True)
+    partial_path.rename(store_path)
+
+
+class ResultStore:
+    # Queries of a store written by build_store. Opening it maps the columns without reading them; a query reads
+    # the offsets of its source and the pages of the source's rows, and a point lookup binary-searches the sorted
+    # targets among them. Distances are returned like in the published results (see to_frame).
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.metadata = read_metadata(self.path)
+        self.participants = NameTable(np.load(self.path / 'participants.npy'), self.metadata['num_participants'])
+        self.offsets = np.load(self.path / 'offsets.npy', mmap_mode='r')
+        self.columns = {name: np.load(self.path / f'{name}.npy', mmap_mode='r') for name in STORE_COLUMNS}
+        self._codes = None
+
+    def code(self, participant):
+        # participants are looked up by their string, so integer IDs match both as ints and as given in a URL
+        if self._codes is None:
+            self._codes = {str(participant): code for code, participant in enumerate(self.participants)}
+        if str(participant) in self._codes:
+            return self._codes[str(participant)]
+        raise EntityNotFound(f'Unknown participant {participant}')
+
+    def _rows(self, source):
+        code = self.code(source)
+        return int(self.offsets[code]), int(self.offsets[code + 1])
+
+    def _frame(self, columns):
+        fastest, foremost = timing_columns(self.metadata, columns['fastest'], columns['foremost'])
+        return pd.DataFrame({'shortest': columns['shortest'].astype(np.int64), 'fastest': fastest, 'foremost': foremost},
+                            index=pd.Index([self.participants[code] for code in columns['target'].tolist()], name='target', dtype=object))
+
+    def lookup(self, source, target):
+        # The distances from source to target as a frame of one row, or of none if source does not reach target
+        start, end = self._rows(source)
+        code = self.code(target)
+        row = start + int(np.searchsorted(self.columns['target'][start:end], code))
+        found = int(row < end and self.columns['target'][row] == code)
+        return self._frame({name: np.asarray(column[row:row + found]) for name, column in self.columns.items()})
+
+    def distance(self, source, target):
+        # The shortest, fastest and foremost distance from source to target, or None if it does not reach target
+        frame = self.lookup(source, target)
+        return tuple(frame.iloc[0]) if len(frame) else None
+
+    def neighborhood(self, source, shortest=None, fastest=None, foremost=None):
+        # The distances to all targets source reaches, by target; with thresholds, only the targets reached in
+        # at most shortest hops, within the duration fastest (e.g. timedelta(days=7)), or by the timing foremost
+        start, end = self._rows(source)
+        columns = {name: np.asarray(column[start:end]) for name, column in self.columns.items()}
+        rows = np.ones(end - start, dtype=bool)
+        if shortest is not None:
+            rows &= columns['shortest'] <= shortest
+        if fastest is not None:
+            rows &= columns['fastest'] <= to_epoch_delta(fastest)
+        if foremost is not None:
+            rows &= columns['foremost'] <= to_epoch(foremost)
+        return self._frame({name: column[rows] for name, column in columns.items()})
+
+    def parse_thresholds(self, query):
+        # Thresholds of neighborhood from strings, e.g. of a URL: hops, and durations ('7 days', 'P7D') and
+        # timings (ISO) for datetime timings or ints otherwise
+        parsers = {'shortest': int, 'fastest': pd.Timedelta if self.metadata['datetimes'] else int, 'foremost': pd.Timestamp if self.metadata['datetimes'] else int}
+        return {name: parsers[name](value) for name, value in query.items() if name in DISTANCE_COLUMNS}
+
+
+def query_handler(stores):
+    # Handler of GET /<name>/distance?source=<a>&target=<b> and GET /<name>/neighborhood?source=<a>, optionally
+    # with &shortest=<hops>&fastest=<duration>&foremost=<timing>, answered with JSON records as by to_json
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            url = urlsplit(self.path)
+            parts = [unquote(part) for part in url.path.strip('/').split('/')]
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                if len(parts) != 2 or parts[0] not in stores or parts[1] not in ('distance', 'neighborhood'):
+                    raise EntityNotFound(f'Unknown query {url.path}; use /<name>/distance or /<name>/neighborhood of {", ".join(stores)}')
+                store = stores[parts[0]]
+                if 'source' not in query or (parts[1] == 'distance' and 'target' not in query):
+                    raise ValueError('Missing source or target')
+                if parts[1] == 'distance':
+                    frame = store.lookup(query['source'], query['target'])
+                    body = frame.reset_index().to_json(orient='records', date_format='iso')[1:-1] if len(frame) else 'null'
+                else:
+                    body = store.neighborhood(query['source'], **store.parse_thresholds(query)).reset_index().to_json(orient='records', date_format='iso')
+                self.respond(200, body)
+            except EntityNotFound as error:
+                self.respond(404, pd.Series({'error': str(error)}).to_json())
+            except (ValueError, TypeError) as error:
+                self.respond(400, pd.Series({'error': str(error)}).to_json())
+
+        def respond(self, status, body):
+            body = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return QueryHandler
+
+
+def serve(stores, host='127.0.0.1', port=8000):
+    with ThreadingHTTPServer((host, port), query_handler(stores)) as server:
+        print(f'Serving the results of {", ".join(stores)} at http://{host}:{server.server_address[1]}/')
+        server.serve_forever()
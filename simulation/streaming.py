@@ -0,0 +1,242 @@
+import bz2
+import codecs
+import json
+import mmap
+import os
+import re
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import multiprocessing as mp
+
+import numpy as np
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+from .model import FrozenCommunicationNetwork, to_epoch
+
+BLOCK_SIZE = 1 << 20
+MIN_SEGMENT_SIZE = 1 << 20
+TASKS_PER_PROCESS = 4
+STREAM_START = re.compile(rb'BZh[1-9]1AY&SY')
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def bz2_segments(file_path, num_segments):
+    # Byte ranges of about num_segments parts of a bz2 file that start at bz2 streams, so they decompress on
+    # their own. Files written by to_json, pbzip2 or lbzip2 consist of many streams; others have only one.
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            starts = [match.start() for match in STREAM_START.finditer(data)]
+    if not starts or starts[0] != 0:
+        raise OSError(f'{file_path} is not a bz2 file')
+    segment_size = max(MIN_SEGMENT_SIZE, size // max(num_segments, 1))
+    segments, start = [], 0
+    for end in starts[1:]:
+        if end - start >= segment_size:
+            segments.append((start, end))
+            start = end
+    return segments + [(start, size)]
+
+
+def decompress_segment(file_path, start, end):
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    blocks = []
+    while data:
+        decompressor = bz2.BZ2Decompressor()
+        blocks.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise EOFError(f'Compressed data of {file_path} ended before the end-of-stream marker was reached')
+        data = decompressor.unused_data
+    return b''.join(blocks)
+
+
+def _stream_blocks(file_path):
+    # Decompresses a bz2 file with any number of streams in blocks of BLOCK_SIZE compressed bytes
+    with open(file_path, 'rb') as file:
+        decompressor, started = bz2.BZ2Decompressor(), False
+        while block := file.read(BLOCK_SIZE):
+            while block:
+                yield decompressor.decompress(block)
+                started = True
+                if not decompressor.eof:
+                    break
+                block, decompressor, started = decompressor.unused_data, bz2.BZ2Decompressor(), False
+    if started:
+        raise EOFError(f'Compressed data of {file_path} ended before the end-of-stream marker was reached')
+
+
+def decompressed_blocks(file_path):
+    # Blocks of the decompressed content of a file, without holding more than a block at once
+    file_path = Path(file_path)
+    if file_path.suffix == '.bz2':
+        yield from _stream_blocks(file_path)
+        return
+    with open(file_path, 'rb') as file:
+        while block := file.read(BLOCK_SIZE):
+            yield block
+
+
+class ChannelArrays:
+    # Arrays of a frozen network that grow while its channels are parsed. Participants are numbered in the order
+    # of their first channel, and duplicates within a channel are dropped like by CommunicationNetwork.from_json.
+    def __init__(self):
+        self.vertex_index = {}
+        self.hedge_names = []
+        self.hedge_offsets = array('q', [0])
+        self.hedge_vertices = array('i')
+        self.epochs = array('q')
+        self.timezone = None
+
+    def add(self, chan_id, channel):
+        timing = datetime.fromisoformat(channel['end'])
+        if not self.hedge_names:
+            self.timezone = timing.tzinfo
+        self.hedge_names.append(str(chan_id))
+        self.hedge_vertices.extend(self.vertex_index.setdefault(participant, len(self.vertex_index)) for participant in dict.fromkeys(channel['participants']))
+        self.hedge_offsets.append(len(self.hedge_vertices))
+        self.epochs.append(to_epoch(timing))
+
+    def extend(self, other):
+        # Appends channels parsed on their own, e.g. of a later segment, so only their distinct participants
+        # are looked up; the numbering is the same as if they had been added one by one
+        if not self.hedge_names:
+            self.timezone = other.timezone
+        codes = np.array([self.vertex_index.setdefault(participant, len(self.vertex_index)) for participant in other.vertex_index], dtype=np.int32)
+        self.hedge_offsets.frombytes((np.frombuffer(other.hedge_offsets, dtype=np.int64)[1:] + len(self.hedge_vertices)).tobytes())
+        self.hedge_vertices.frombytes(codes[np.frombuffer(other.hedge_vertices, dtype=np.int32)].tobytes())
+        self.hedge_names += other.hedge_names
+        self.epochs += other.epochs
+
+    def freeze(self, name=None):
+        return FrozenCommunicationNetwork.from_arrays(tuple(self.vertex_index), tuple(self.hedge_names), np.frombuffer(self.hedge_offsets, dtype=np.int64),
+                                                      np.frombuffer(self.hedge_vertices, dtype=np.int32), np.frombuffer(self.epochs, dtype=np.int64),
+                                                      datetimes=bool(self.hedge_names), timezone_=self.timezone, name=name)
+
+
+def _add_lines(arrays, lines):
+    # Parses complete lines of channels, as written by CommunicationNetwork.to_json, at once; returns False if
+    # the lines are not of that form, e.g., if channels span several lines
+    try:
+        channels = loads('{' + lines.rstrip().rstrip(',') + '}' if isinstance(lines, str) else b'{' + lines.rstrip().rstrip(b',') + b'}')
+    except ValueError:
+        return False
+    for chan_id, channel in channels.items():
+        arrays.add(chan_id, channel)
+    return True
+
+
+def _skip(text, pos):
+    return WHITESPACE.match(text, pos).end()
+
+
+class ChannelParser:
+    # Incremental parser of the JSON document {"<id>": {"participants": [...], "end": "<iso timing>"}, ...} that
+    # is fed blocks of its bytes. Complete lines of channels are parsed at once; any other layout, e.g. the whole
+    # document in one line, is scanned channel by channel. Only the unparsed rest of a block is kept.
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._scan = json.JSONDecoder().raw_decode
+        self._text = ''
+        self._state = 'start'
+
+    def feed(self, block):
+        text = self._text + self._decoder.decode(block)
+        pos = _skip(text, 0)
+        if self._state == 'start' and pos < len(text):
+            if text[pos] != '{':
+                raise ValueError('The network is not a JSON object of channels')
+            pos, self._state = _skip(text, pos + 1), 'channels'
+        if self._state == 'channels':
+            cut = text.rfind('\n')
+            if cut > pos and _add_lines(self.arrays, text[pos:cut]):
+                pos = _skip(text, cut)
+            pos = self._scan_channels(text, pos)
+        if self._state == 'end' and pos < len(text):
+            raise ValueError('Extra data after the end of the network')
+        self._text = text[pos:]
+
+    def _scan_channels(self, text, pos):
+        while pos < len(text):
+            if text[pos] == '}':
+                self._state = 'end'
+                return _skip(text, pos + 1)
+            item = pos
+            try:
+                chan_id, pos = self._scan(text, pos)
+                pos = _skip(text, pos)
+                if text[pos] != ':':
+                    raise ValueError(f'Expected a colon after channel {chan_id}')
+                channel, pos = self._scan(text, _skip(text, pos + 1))
+                pos = _skip(text, pos)
+                if text[pos] == ',':
+                    pos = _skip(text, pos + 1)
+                elif text[pos] != '}':
+                    raise ValueError(f'Expected a comma or the end of the network after channel {chan_id}')
+            except (IndexError, json.JSONDecodeError):
+                # the channel continues in the next block
+                return item
+            self.arrays.add(chan_id, channel)
+        return pos
+
+    def at_line_end(self):
+        return self._state == 'channels' and not self._text.strip()
+
+    def close(self):
+        if self._state != 'end':
+            raise ValueError(f'Invalid or truncated network at {self._text[:80]!r}')
+        return self.arrays
+
+
+def parse_segment(file_path, start, end):
+    # Decompresses a segment of a bz2 file and parses its complete lines of channels; the partial lines at both
+    # ends, or the whole segment if its lines are not lines of channels, are returned to be fed to the parser
+    data = decompress_segment(file_path, start, end)
+    first, last = data.find(b'\n'), data.rfind(b'\n')
+    arrays = ChannelArrays()
+    if first == last or not _add_lines(arrays, data[first + 1:last]):
+        return data, None, b''
+    return data[:first + 1], arrays, data[last:]
+
+
+def read_network(file_path, name=None, num_processes=None):
+    # Streaming alternative to CommunicationNetwork.from_json(file_path).freeze() that builds the arrays of the
+    # frozen network while it parses the channels, so the whole document is never in memory. The segments of
+    # multi-stream bz2 files are decompressed and parsed in parallel, with at most TASKS_PER_PROCESS segments per
+    # process in flight, and the main process only joins their arrays.
+    num_processes = os.cpu_count() if num_processes is None else num_processes
+    parser = ChannelParser(ChannelArrays())
+    segments = bz2_segments(file_path, num_processes * TASKS_PER_PROCESS) if num_processes > 1 and Path(file_path).suffix == '.bz2' else []
+    if len(segments) < 2:
+        for block in decompressed_blocks(file_path):
+            parser.feed(block)
+        return parser.close().freeze(name)
+
+    def join(head, arrays, tail):
+        parser.feed(head)
+        if arrays is not None:
+            if not parser.at_line_end():
+                raise ValueError(f'The lines of {file_path} are not lines of channels')
+            parser.arrays.extend(arrays)
+        parser.feed(tail)
+
+    with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=num_processes) as executor:
+        futures = deque()
+        for start, end in segments:
+            futures.append(executor.submit(parse_segment, file_path, start, end))
+            if len(futures) == num_processes * TASKS_PER_PROCESS:
+                join(*futures.popleft().result())
+        while futures:
+            join(*futures.popleft().result())
+    return parser.close().freeze(name)
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .model import CommunicationNetwork
+
+START = datetime(2020, 1, 1)
+
+
+def synthetic_network(num_channels, seed=0, num_participants=None, days=28, team_size=20, locality=0.8, start=START, integer_timings=False, name=None):  # pylint: disable=too-many-arguments,too-many-locals
+    # Seeded code review network with heavy tails like the published ones: most reviews have two or three
+    # participants, a few dozens; the activity of participants is Pareto-distributed; participants mostly review
+    # within their team; and reviews close during working hours on weekdays. Scales linearly in the number of
+    # channels, by default with one participant per eight channels. Integer timings are microseconds since start.
+    rng = np.random.default_rng(seed)
+    if num_participants is None:
+        num_participants = max(2, num_channels // 8)
+
+    # participants are ordered by team, so a team is a contiguous range of the cumulative activity
+    activity = np.cumsum(rng.pareto(1.5, num_participants) + 1)
+    team_starts = np.arange(0, num_participants, team_size)
+    team_activity = np.concatenate(([0], activity))[np.append(team_starts, num_participants)]
+
+    sizes = np.minimum(1 + rng.zipf(2.2, num_channels), min(num_participants, 100))
+    teams = np.searchsorted(team_activity[1:], rng.random(num_channels) * activity[-1], side='right')
+    slot_teams = np.repeat(teams, sizes)
+    local = rng.random(len(slot_teams)) < locality
+    low, high = np.where(local, team_activity[slot_teams], 0), np.where(local, team_activity[slot_teams + 1], activity[-1])
+    participants = np.minimum(np.searchsorted(activity, low + rng.random(len(slot_teams)) * (high - low), side='right'), num_participants - 1).tolist()
+
+    # weekends are five times quieter than weekdays, and reviews close around 2 pm
+    day_weights = np.array([1.0 if (start + timedelta(days=day)).weekday() < 5 else 0.2 for day in range(days)])
+    day_of_channel = rng.choice(days, num_channels, p=day_weights / day_weights.sum())
+    seconds = np.clip(rng.normal(14 * 3600, 3 * 3600, num_channels), 0, 24 * 3600 - 1)
+    microseconds = (day_of_channel * 86400 + seconds) * 1e6 + rng.integers(0, 1000000, num_channels)
+
+    channels, timings, offset = {}, {}, 0
+    for i, (size, microsecond) in enumerate(zip(sizes.tolist(), microseconds.astype(np.int64).tolist())):
+        channels[f'c{i}'] = set(participants[offset:offset + size])
+        timings[f'c{i}'] = microsecond if integer_timings else start + timedelta(microseconds=microsecond)
+        offset += size
+    return CommunicationNetwork(channels, timings, name=name)
@@ -0,0 +1,49 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from simulation.analysis import cumulative_reach, cumulative_reach_from_chunks
+from simulation.model import CommunicationNetwork
+from simulation.minimal_paths import single_source_all_distances
+from simulation.results import ResultWriter, to_frame
+from test.test_minimal_paths import random_network
+from test.test_notebook import compute, create_dummy
+
+
+class CumulativeReachTest(unittest.TestCase):
+    def test_dummy(self):
+        pd.testing.assert_frame_equal(cumulative_reach(create_dummy()), compute(create_dummy()))
+
+    def test_random(self):
+        rng = np.random.default_rng(0)
+        participants = [f'v{i}' for i in range(12)]
+        category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
+        for _ in range(10):
+            rows = [(source, target, pd.Timedelta(int(rng.integers(0, 40 * 24 * 3600 * 10 ** 9))))
+                    for source in rng.choice(participants, 8, replace=False) for target in rng.choice(participants, rng.integers(1, 12), replace=False)]
+            result = pd.DataFrame(rows, columns=['source', 'target', 'fastest']).astype({'source': category, 'target': category})
+            result = result.set_index(['source', 'target']).sort_index()
+            pd.testing.assert_frame_equal(cumulative_reach(result), compute(result))
+
+    def test_chunks(self):
+        cn = random_network(1, num_hedges=200).freeze()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ResultWriter(Path(tmp_dir) / 'test.chunks', cn, chunk_rows=40) as writer:
+                for source in sorted(cn.participants()):
+                    writer.append(source, single_source_all_distances(cn, source))
+            pd.testing.assert_frame_equal(cumulative_reach_from_chunks(Path(tmp_dir) / 'test.chunks'), compute(to_frame(Path(tmp_dir) / 'test.chunks')))
+
+    def test_chunks_without_datetimes(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2']}, {'h1': 1}).freeze()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ResultWriter(Path(tmp_dir) / 'test.chunks', cn) as writer:
+                writer.append('v1', single_source_all_distances(cn, 'v1'))
+            with self.assertRaises(ValueError):
+                cumulative_reach_from_chunks(Path(tmp_dir) / 'test.chunks')
+
+
+if __name__ == "__main__":
+    unittest.main()
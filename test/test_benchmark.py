@@ -0,0 +1,33 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from simulation.benchmark import append_history, compare, read_history, run_benchmarks
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run_benchmarks(self):
+        results = run_benchmarks(num_channels=200, num_sources=2, repeat=2, select=['from_json', 'bellman_ford', 'all_distances'])
+        self.assertEqual(set(results), {'from_json', 'single_source_all_distances', 'single_source_bellman_ford_hypergraph[shortest]',
+                                        'single_source_bellman_ford_hypergraph[fastest]', 'single_source_bellman_ford_hypergraph[foremost]'})
+        for result in results.values():
+            self.assertEqual(result['repeat'], 2)
+            self.assertLessEqual(result['min'], result['median'])
+
+    def test_history(self):
+        def entry(minimum, parameters):
+            return {'machine': 'm', 'parameters': parameters, 'results': {'a': {'min': minimum, 'median': minimum}, 'b': {'min': 1.0, 'median': 1.0}}}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'benchmarks' / 'history.json'
+            self.assertEqual(compare(entry(1.0, {'channels': 1}), read_history(path)), (None, {'a': (1.0, 1.0, None, False), 'b': (1.0, 1.0, None, False)}))
+            append_history(path, entry(1.0, {'channels': 1}))
+            append_history(path, entry(0.5, {'channels': 2}))
+            self.assertEqual(len(read_history(path)), 2)
+            previous, comparison = compare(entry(2.0, {'channels': 1}), read_history(path), threshold=1.5)
+            self.assertEqual(previous['parameters'], {'channels': 1})
+            self.assertEqual(comparison, {'a': (2.0, 2.0, 2.0, True), 'b': (1.0, 1.0, 1.0, False)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,20 @@
 import unittest
+import random
+import numpy as np
+from datetime import datetime, timedelta
 import simulation.model
 
 from simulation.model import CommunicationNetwork
-from simulation.minimal_paths import single_source_dijkstra_vertices, single_source_dijkstra_hyperedges, single_source_bellman_ford_hypergraph, DistanceType
+from simulation.minimal_paths import (single_source_dijkstra_vertices, single_source_dijkstra_hyperedges, single_source_bellman_ford_hypergraph, single_source_all_distances,
+                                      single_source_all_distances_until, update_all_distances, all_pairs_foremost, all_pairs_shortest, all_pairs_reachability,
+                                      all_pairs_reachable_counts, single_source_successor_dag, take_counters, DistanceType)
+
+
+def random_network(seed, num_vertices=25, num_hedges=80):
+    rng = random.Random(seed)
+    channels = {f'h{i}': rng.sample([f'v{j}' for j in range(num_vertices)], rng.randint(1, 4)) for i in range(num_hedges)}
+    timings = {hedge: datetime(2020, 1, 1) + timedelta(hours=rng.randint(0, 40)) for hedge in channels}
+    return CommunicationNetwork(channels, timings)
 
 class MinimalPath(unittest.TestCase):
     cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3})
@@ -10,6 +22,11 @@ class MinimalPath(unittest.TestCase):
     def test_1(self):
         self.assertEqual(single_source_dijkstra_vertices(MinimalPath.cn, 'v1', DistanceType.SHORTEST, min_timing=0), {'v2': 1, 'v3': 2, 'v4': 3})
 
+    def test_min_timing_deprecated(self):
+        for single_source in (single_source_dijkstra_vertices, single_source_dijkstra_hyperedges, single_source_bellman_ford_hypergraph):
+            with self.assertWarns(DeprecationWarning):
+                self.assertEqual(single_source(MinimalPath.cn, 'v1', DistanceType.SHORTEST, min_timing=2), single_source(MinimalPath.cn, 'v1', DistanceType.SHORTEST))
+
     def test_2(self):
         result_1 = single_source_dijkstra_vertices(MinimalPath.cn, 'v1', DistanceType.SHORTEST, min_timing=0)
         result_2 = single_source_dijkstra_hyperedges(MinimalPath.cn, 'v1', DistanceType.SHORTEST, min_timing=0)
@@ -40,6 +57,183 @@ class MinimalPath(unittest.TestCase):
         result_dijkstra = single_source_dijkstra_vertices(MinimalPath.cn, 'v1', DistanceType.SHORTEST, min_timing=0)
         self.assertEqual(result_bellman_ford, result_dijkstra, 'Bellman-Ford and Dijkstra implementations are not equivalent')
 
+    def test_bellman_ford_random(self):
+        for seed in range(6):
+            cn = random_network(seed)
+            for vertex in cn.vertices():
+                for distance_type in DistanceType:
+                    self.assertEqual(single_source_bellman_ford_hypergraph(cn, vertex, distance_type), single_source_dijkstra_hyperedges(cn, vertex, distance_type), 'Bellman-Ford and Dijkstra implementations are not equivalent')
+
+    def test_bellman_ford_temporal(self):
+        # v1 only reaches v3 via h1 and a strictly later h2, and not v4 via the earlier h3
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v1', 'v2']}, {'h1': 1, 'h2': 3, 'h3': 2, 'h4': 3})
+        self.assertEqual(single_source_bellman_ford_hypergraph(cn, 'v1', DistanceType.SHORTEST), {'v2': 1, 'v3': 2})
+        self.assertEqual(single_source_bellman_ford_hypergraph(cn, 'v1', DistanceType.FASTEST), {'v2': 0, 'v3': 2})
+        self.assertEqual(single_source_bellman_ford_hypergraph(cn, 'v1', DistanceType.FOREMOST), {'v2': 1, 'v3': 3})
+
+class AllPairsForemost(unittest.TestCase):
+    def test_foremost_sweep(self):
+        self.assertEqual(dict(all_pairs_foremost(MinimalPath.cn)), {v: single_source_dijkstra_hyperedges(MinimalPath.cn, v, DistanceType.FOREMOST, min_timing=0) for v in MinimalPath.cn.vertices()})
+
+    def test_foremost_sweep_random(self):
+        for seed, block_size in enumerate((3, 8, 9, 1024)):
+            cn = random_network(seed)
+            result = dict(all_pairs_foremost(cn, block_size=block_size))
+            for vertex in cn.vertices():
+                self.assertEqual(result[vertex], single_source_dijkstra_hyperedges(cn, vertex, DistanceType.FOREMOST), 'Foremost sweep and Dijkstra are not equivalent')
+
+    def test_foremost_sweep_unknown_vertex(self):
+        with self.assertRaises(simulation.model.EntityNotFound):
+            dict(all_pairs_foremost(MinimalPath.cn, ['v69']))
+
+
+class AllPairsShortest(unittest.TestCase):
+    def test_bitset_bfs(self):
+        self.assertEqual(dict(all_pairs_shortest(MinimalPath.cn)), {v: single_source_dijkstra_vertices(MinimalPath.cn, v, DistanceType.SHORTEST, min_timing=0) for v in MinimalPath.cn.vertices()})
+
+    def test_bitset_bfs_random(self):
+        for seed, block_size in enumerate((3, 8, 64, 70)):
+            cn = random_network(seed)
+            result = dict(all_pairs_shortest(cn, block_size=block_size))
+            for vertex in cn.vertices():
+                self.assertEqual(result[vertex], single_source_dijkstra_hyperedges(cn, vertex, DistanceType.SHORTEST), 'Bitset BFS and Dijkstra are not equivalent')
+
+    def test_bitset_bfs_multiple_paths(self):
+        result = dict(all_pairs_shortest(TestMultiplePaths.cn_multiple_paths, ['v1']))
+        self.assertEqual(result['v1'], {'v2': 1, 'v3': 1})
+
+
+class AllPairsReachability(unittest.TestCase):
+    def test_reachable_counts(self):
+        self.assertEqual(all_pairs_reachable_counts(MinimalPath.cn), {'v1': 3, 'v2': 3, 'v3': 2, 'v4': 1})
+        # a subset of sources still reaches every vertex
+        self.assertEqual(all_pairs_reachable_counts(MinimalPath.cn, ['v1']), {'v1': 3})
+        self.assertEqual(all_pairs_reachable_counts(MinimalPath.cn, ['v3', 'v1'], block_size=2), {'v3': 2, 'v1': 3})
+        targets, bits = next(all_pairs_reachability(MinimalPath.cn, ['v1'], target_vertices=['v4', 'v1']))
+        self.assertEqual((targets, np.unpackbits(bits, axis=1, bitorder='little')[0, :2].tolist()), (['v4', 'v1'], [1, 0]))
+
+    def test_reachability_random(self):
+        for seed in range(6):
+            cn = random_network(seed)
+            vertices = sorted(cn.vertices())
+            for block_size in (8, 5, 1024):
+                reached = set()
+                for targets, bits in all_pairs_reachability(cn, vertices, block_size=block_size):
+                    rows, columns = np.nonzero(np.unpackbits(bits, axis=1, bitorder='little'))
+                    reached |= {(vertices[row], targets[column]) for row, column in zip(rows, columns)}
+                self.assertEqual(reached, {(source, target) for source in vertices for target in single_source_all_distances(cn, source)})
+            self.assertEqual(all_pairs_reachable_counts(cn), {source: len(single_source_all_distances(cn, source)) for source in cn.vertices()})
+
+
+class SuccessorDagDistances(unittest.TestCase):
+    def test_successor_dag(self):
+        for distance_type in DistanceType:
+            self.assertEqual(single_source_successor_dag(MinimalPath.cn, 'v1', distance_type), single_source_dijkstra_hyperedges(MinimalPath.cn, 'v1', distance_type, min_timing=0))
+
+    def test_successor_dag_random(self):
+        for seed in range(4):
+            cn = random_network(seed).freeze()
+            for distance_type in DistanceType:
+                for vertex in cn.vertices():
+                    self.assertEqual(single_source_successor_dag(cn, vertex, distance_type), single_source_dijkstra_hyperedges(cn, vertex, distance_type), 'DAG and Dijkstra implementations are not equivalent')
+
+    def test_reduced_dag_shortest(self):
+        with self.assertRaises(ValueError):
+            single_source_successor_dag(MinimalPath.cn, 'v1', DistanceType.SHORTEST, dag=MinimalPath.cn.freeze().successor_dag(reduced=True))
+
+
+class AllDistances(unittest.TestCase):
+    def test_all_distances(self):
+        self.assertEqual(single_source_all_distances(MinimalPath.cn, 'v1'), {'v2': (1, 0, 1), 'v3': (2, 1, 2), 'v4': (3, 2, 3)})
+
+    def test_all_distances_random(self):
+        for seed in range(6):
+            cn = random_network(seed)
+            for vertex in cn.vertices():
+                result = single_source_all_distances(cn, vertex)
+                for i, distance_type in enumerate(DistanceType):
+                    self.assertEqual({target: distances[i] for target, distances in result.items()}, single_source_dijkstra_hyperedges(cn, vertex, distance_type), 'Single traversal and Dijkstra are not equivalent')
+
+    def test_all_distances_unknown_vertex(self):
+        with self.assertRaises(simulation.model.EntityNotFound):
+            single_source_all_distances(MinimalPath.cn, 'v69')
+
+
+class Counters(unittest.TestCase):
+    def test_counters(self):
+        take_counters()
+        single_source_all_distances(MinimalPath.cn, 'v1')
+        self.assertEqual(take_counters(), {'pushes': 3, 'pops': 3, 'stale_pops': 0, 'relaxations': 5, 'scanned': 6})
+        self.assertEqual(take_counters(), {'pushes': 0, 'pops': 0, 'stale_pops': 0, 'relaxations': 0, 'scanned': 0})
+        single_source_dijkstra_hyperedges(MinimalPath.cn, 'v1', DistanceType.SHORTEST)
+        single_source_dijkstra_hyperedges(MinimalPath.cn, 'v4', DistanceType.SHORTEST)
+        self.assertEqual(take_counters(), {'pushes': 4, 'pops': 4, 'stale_pops': 0, 'relaxations': 2, 'scanned': 2})
+
+    def test_counters_random(self):
+        cn = random_network(1).freeze()
+        for vertex in cn.vertices():
+            take_counters()
+            single_source_all_distances(cn, vertex)
+            counters = take_counters()
+            self.assertEqual(counters['pushes'], counters['pops'])
+            self.assertLessEqual(counters['stale_pops'], counters['pops'])
+            self.assertLessEqual(counters['relaxations'], counters['scanned'])
+            single_source_dijkstra_vertices(cn, vertex, DistanceType.FASTEST)
+            counters = take_counters()
+            self.assertEqual(counters['pushes'], counters['pops'])
+            self.assertEqual(counters['pushes'], counters['relaxations'] + 1)
+
+
+class UpdateAllDistances(unittest.TestCase):
+    def test_update(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': 1, 'h2': 2})
+        previous = {source: single_source_all_distances(cn, source, latest_starts=True) for source in cn.participants()}
+        self.assertEqual(previous['v1'], {'v2': (1, 0, 1, 1), 'v3': (2, 1, 2, 1)})
+        cn.add_channels({'h3': ['v1', 'v3'], 'h4': ['v3', 'v4']}, {'h3': 3, 'h4': 4})
+        self.assertEqual(dict(update_all_distances(cn, previous, 3)), {'v1': {'v3': (1, 0, 2, 3), 'v4': (2, 1, 4, 3)}, 'v2': {'v1': (1, 0, 1, 2), 'v4': (2, 2, 4, 2)},
+                                                                       'v3': {'v1': (1, 0, 3, 3), 'v4': (1, 0, 4, 4)}, 'v4': {'v3': (1, 0, 4, 4)}})
+
+    def test_update_random(self):
+        for seed in range(10):
+            full = random_network(seed)
+            rng = random.Random(seed)
+            cut = sorted(full.timings().values())[rng.randint(1, len(full.timings()) - 1)]
+            cn = CommunicationNetwork({hedge: vertices for hedge, vertices in full._hedges.items() if full.timings(hedge) < cut}, {hedge: timing for hedge, timing in full.timings().items() if timing < cut})  # pylint: disable=protected-access
+            distances = {source: single_source_all_distances(cn, source, latest_starts=True) for source in cn.participants()}
+            cn.add_channels({hedge: vertices for hedge, vertices in full._hedges.items() if full.timings(hedge) >= cut}, full.timings())  # pylint: disable=protected-access
+            for source, changes in update_all_distances(cn, distances, cut):
+                distances.setdefault(source, {}).update(changes)
+            for source in full.participants():
+                self.assertEqual(distances[source], single_source_all_distances(full, source, latest_starts=True), 'Updated and recomputed distances differ')
+
+
+class WindowDistances(unittest.TestCase):
+    def test_window_random(self):
+        for seed in range(6):
+            cn = random_network(seed).freeze()
+            rng = random.Random(seed)
+            timings = sorted(cn.timings().values())
+            start = rng.choice(timings)
+            ends = sorted(rng.sample(timings, 3))
+            sub_networks = []
+            for end in ends:
+                hedges = [hedge for hedge, timing in cn.timings().items() if start <= timing < end]
+                sub_networks.append(CommunicationNetwork({hedge: cn.vertices(hedge) for hedge in hedges}, {hedge: cn.timings(hedge) for hedge in hedges}))
+            for vertex in cn.vertices():
+                for end, sub_network, result in zip(ends, sub_networks, single_source_all_distances_until(cn.window(start, ends[-1]), vertex, ends)):
+                    expected = single_source_all_distances(sub_network, vertex) if vertex in sub_network.vertices() else {}
+                    self.assertEqual(result, expected, 'Window and rebuilt network distances differ')
+                    if start < end:
+                        self.assertEqual(single_source_all_distances(cn.window(start, end), vertex), expected)
+
+    def test_window_batched(self):
+        cn = random_network(0).freeze()
+        with self.assertRaises(ValueError):
+            list(all_pairs_foremost(cn.window(end=datetime(2020, 1, 2))))
+        with self.assertRaises(ValueError):
+            list(all_pairs_shortest(cn.window(end=datetime(2020, 1, 2))))
+
+
 class MinimalPathExceptionHandling(unittest.TestCase):
         def test_minimal_path_unknown_vertice(self):
             cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3})
@@ -1,10 +1,13 @@
 from datetime import datetime
 import unittest
+import tempfile
 from pathlib import Path
 import json
 import bz2
-from simulation.model import CommunicationNetwork
+from simulation.model import CommunicationNetwork, FrozenCommunicationNetwork, FrozenTimeVaryingHypergraph, SuccessorDag, EntityNotFound
 import platform
+import pickle
+import numpy as np
 from packaging import version
 
 
@@ -87,6 +90,167 @@ class ModelTest(unittest.TestCase):
         self.assertRaises(OSError, CommunicationNetwork.from_json, test_file_path)
 
 
+class FrozenModelTest(unittest.TestCase):
+
+    cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3}, name='test')
+    cn_datetime = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': datetime(2020, 2, 20, 5, 2, 59, 1), 'h2': datetime(2020, 2, 21)})
+
+    def test_freeze(self):
+        frozen = FrozenModelTest.cn.freeze()
+        self.assertIsInstance(frozen, FrozenCommunicationNetwork)
+        self.assertIs(frozen.freeze(), frozen)
+        self.assertEqual(frozen.name, 'test')
+        self.assertEqual(frozen.vertices(), FrozenModelTest.cn.vertices())
+        self.assertEqual(frozen.hyperedges(), FrozenModelTest.cn.hyperedges())
+        self.assertEqual(frozen.timings(), FrozenModelTest.cn.timings())
+        for hedge in FrozenModelTest.cn.hyperedges():
+            self.assertEqual(frozen.vertices(hedge), FrozenModelTest.cn.vertices(hedge))
+        for vertex in FrozenModelTest.cn.vertices():
+            self.assertEqual(frozen.hyperedges(vertex), FrozenModelTest.cn.hyperedges(vertex))
+        self.assertEqual(frozen.participants('h2'), {'v2', 'v3'})
+
+    def test_freeze_datetimes(self):
+        frozen = FrozenModelTest.cn_datetime.freeze()
+        self.assertEqual(frozen.timings(), FrozenModelTest.cn_datetime.timings())
+        self.assertEqual(frozen.epochs.dtype, 'int64')
+
+    def test_from_arrays(self):
+        frozen = FrozenTimeVaryingHypergraph.from_arrays(['v1', 'v2', 'v3'], ['h1', 'h2'], [0, 2, 4], [0, 1, 1, 2], [1, 2])
+        self.assertEqual(frozen.vertices('h2'), {'v2', 'v3'})
+        self.assertEqual(frozen.hyperedges('v2'), {'h1', 'h2'})
+        self.assertEqual(list(frozen.vertex_offsets), [0, 1, 3, 4])
+        self.assertEqual(frozen.timings('h2'), 2)
+        with self.assertRaises(ValueError):
+            FrozenTimeVaryingHypergraph.from_arrays(['v1', 'v2'], ['h1'], [0, 3], [0, 1], [1])
+
+    def test_window(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v1', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4}).freeze()
+        window = cn.window(2, 4)
+        self.assertEqual(window.hyperedges(), {'h2', 'h3'})
+        self.assertEqual(window.vertices(), {'v2', 'v3', 'v4'})
+        self.assertEqual(window.timings(), {'h2': 2, 'h3': 3})
+        self.assertEqual(window.hyperedges('v2'), {'h2'})
+        self.assertEqual(window.window(end=3).hyperedges(), {'h2'})
+        self.assertEqual(window.adjacency()[1], ((), (1, ), (1, 2), (2, )))
+        self.assertEqual(cn.hyperedges(), {'h1', 'h2', 'h3', 'h4'})
+        with self.assertRaises(EntityNotFound):
+            window.timings('h4')
+        with self.assertRaises(ValueError):
+            window.successor_dag()
+        with tempfile.TemporaryDirectory() as tmp_dir, self.assertRaises(ValueError):
+            window.to_columnar(Path(tmp_dir) / 'window.columnar')
+
+    def test_as_epochs(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': datetime(2020, 1, 1), 'h2': datetime(2020, 1, 2, 12)}).freeze()
+        epochs = cn.as_epochs()
+        self.assertEqual(epochs.timings('h2'), int(cn.epochs[1]))
+        self.assertEqual(cn.timings('h2'), datetime(2020, 1, 2, 12))
+        self.assertEqual(epochs.window(int(cn.epochs[1])).timings(), {'h2': int(cn.epochs[1])})
+        self.assertEqual(cn.to_duration(epochs.to_duration(int(cn.epochs[1] - cn.epochs[0]))), cn.timings('h2') - cn.timings('h1'))
+        self.assertEqual(epochs.content_hash(), cn.content_hash())
+
+    def test_pruned(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2', 'v3'], 'h2': ['v1', 'v2'], 'h3': ['v1', 'v3', 'v2'], 'h4': ['v3'], 'h5': ['v2', 'v3'], 'h6': ['v3', 'v4'], 'h7': ['v4', 'v4']},
+                                  {'h1': 1, 'h2': 1, 'h3': 1, 'h4': 2, 'h5': 3, 'h6': 3, 'h7': 4}, name='test').freeze()
+        pruned, report = cn.pruned()
+        self.assertEqual(pruned.name, 'test')
+        self.assertEqual(pruned.hyperedges(), {'h1', 'h5', 'h6'})
+        self.assertEqual(pruned.vertex_names, cn.vertex_names)
+        self.assertEqual(pruned.timings(), {'h1': 1, 'h5': 3, 'h6': 3})
+        self.assertEqual(report, {'hedges': 7, 'small': 2, 'concurrent_subsets': 2, 'incidences': 15, 'pruned_incidences': 8})
+        with self.assertRaises(ValueError):
+            cn.window(2).pruned()
+
+    def test_vertex_classes(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2', 'v3'], 'h2': ['v2', 'v3', 'v4'], 'h3': ['v4', 'v5']}, {'h1': 1, 'h2': 2, 'h3': 3}).freeze()
+        self.assertEqual([cn.vertex_names[vertex] for vertex in cn.vertex_classes()], ['v1', 'v2', 'v2', 'v4', 'v5'])
+
+    def test_add_channels(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': 1, 'h2': 2})
+        self.assertEqual(cn.freeze().vertices(), {'v1', 'v2', 'v3'})
+        cn.add_channels({'h3': ['v3', 'v4'], 'h4': ['v5']}, {'h3': 3, 'h4': 5})
+        self.assertEqual(cn.participants(), {'v1', 'v2', 'v3', 'v4', 'v5'})
+        self.assertEqual(cn.channels('v3'), {'h2', 'h3'})
+        self.assertEqual(cn.timings('h4'), 5)
+        self.assertEqual(cn.freeze().vertices('h3'), {'v3', 'v4'})
+        for channels, timings in (({'h5': ['v1']}, {'h5': 5}), ({'h1': ['v1']}, {'h1': 6}), ({'h5': ['v1']}, {})):
+            with self.assertRaises(ValueError):
+                cn.add_channels(channels, timings)
+        with self.assertRaises(TypeError):
+            cn.freeze().add_channels({'h5': ['v1']}, {'h5': 6})
+        self.assertEqual(len(cn.channels()), 4)
+
+    def test_hyperedges_after(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v1'], 'h3': ['v1', 'v3'], 'h4': ['v1']}, {'h1': 3, 'h2': 1, 'h3': 2, 'h4': 2})
+        self.assertEqual(cn.hyperedges_after('v1', 0), ['h2', 'h3', 'h4', 'h1'])
+        self.assertEqual(cn.hyperedges_after('v1', 1), ['h3', 'h4', 'h1'])
+        self.assertEqual(cn.hyperedges_after('v1', 2), ['h1'])
+        self.assertEqual(cn.hyperedges_after('v1', 3), [])
+        self.assertEqual(FrozenModelTest.cn_datetime.hyperedges_after('v2', datetime(2020, 2, 20, 5, 2, 59, 1)), ['h2'])
+
+    def test_successor_dag(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v2', 'v3'], 'h4': ['v3']}, {'h1': 1, 'h2': 2, 'h3': 2, 'h4': 3}).freeze()
+        names = cn.hedge_names
+        full = cn.successor_dag()
+        self.assertEqual({names[h]: {names[s] for s in full.successor_ids(h)} for h in range(4)}, {'h1': {'h2', 'h3'}, 'h2': {'h4'}, 'h3': {'h4'}, 'h4': set()})
+        chain = CommunicationNetwork({'h1': ['v1'], 'h2': ['v1'], 'h3': ['v1']}, {'h1': 1, 'h2': 2, 'h3': 3}).freeze()
+        self.assertEqual(len(chain.successor_dag().successors), 3)
+        self.assertEqual(len(chain.successor_dag(reduced=True).successors), 2)
+
+    def test_successor_dag_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            dag = FrozenModelTest.cn.freeze().successor_dag(cache_dir=cache_dir)
+            path = Path(cache_dir) / f'test.full-{FrozenModelTest.cn.freeze().content_hash()[:16]}.dag'
+            self.assertTrue(path.exists())
+            loaded = SuccessorDag.load(path)
+            self.assertIsInstance(loaded.successors, np.memmap)
+            self.assertEqual(loaded.successors.tolist(), dag.successors.tolist())
+            self.assertEqual(loaded.offsets.tolist(), dag.offsets.tolist())
+            self.assertFalse(loaded.reduced)
+            self.assertEqual([child.name for child in Path(cache_dir).iterdir()], [path.name])
+
+    def test_columnar(self):
+        with tempfile.TemporaryDirectory() as path:
+            FrozenModelTest.cn_datetime.freeze().to_columnar(path)
+            loaded = CommunicationNetwork.from_columnar(path, name='columnar')
+            self.assertIsInstance(loaded, FrozenCommunicationNetwork)
+            self.assertIsInstance(loaded.epochs, np.memmap)
+            self.assertEqual(loaded.name, 'columnar')
+            self.assertEqual(loaded.timings(), FrozenModelTest.cn_datetime.timings())
+            self.assertEqual(loaded.hyperedges('v2'), {'h1', 'h2'})
+            self.assertEqual(loaded.hyperedges_after('v2', datetime(2020, 2, 20)), ['h1', 'h2'])
+            with self.assertRaises(TypeError):
+                CommunicationNetwork({'h1': [1, 'v2']}, {'h1': 1}).freeze().to_columnar(Path(path) / 'mixed')
+
+    def test_columnar_integers(self):
+        # hashed participant IDs, like in the published data, keep their type
+        cn = CommunicationNetwork({'h1': [-1000302490388055954, 2], 'h2': [2, 999681621755937669]}, {'h1': 1, 'h2': 2})
+        with tempfile.TemporaryDirectory() as path:
+            cn.freeze().to_columnar(path)
+            loaded = CommunicationNetwork.from_columnar(path)
+            self.assertEqual(list(loaded.vertex_names), list(cn.freeze().vertex_names))
+            self.assertEqual(sorted(loaded.participants()), [-1000302490388055954, 2, 999681621755937669])
+            self.assertEqual(loaded.hyperedges(2), {'h1', 'h2'})
+
+    def test_columnar_pickle(self):
+        with tempfile.TemporaryDirectory() as path:
+            FrozenModelTest.cn.freeze().to_columnar(path)
+            loaded = CommunicationNetwork.from_columnar(path)
+            self.assertEqual(loaded.name, 'test')
+            data = pickle.dumps(loaded)
+            self.assertLess(len(data), 1000)
+            unpickled = pickle.loads(data)
+            self.assertIsInstance(unpickled.epochs, np.memmap)
+            self.assertEqual(unpickled.vertices(), FrozenModelTest.cn.vertices())
+
+    def test_unknown_entities(self):
+        frozen = FrozenModelTest.cn.freeze()
+        with self.assertRaises(EntityNotFound):
+            frozen.hyperedges('v69')
+        with self.assertRaises(EntityNotFound):
+            frozen.vertices('h69')
+
+
 class ModelDataTest(unittest.TestCase):
     def test_model_with_data(self):
         communciation_network = CommunicationNetwork.from_json('./data/networks/microsoft.json.bz2')
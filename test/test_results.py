@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta, timezone
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from simulation.model import CommunicationNetwork
+from simulation.minimal_paths import single_source_all_distances, update_all_distances, all_pairs_reachability
+from simulation.results import ResultWriter, append_metrics, distance_array, export_reachability, merge_results, read_metrics, read_chunks, read_columns, read_participants, to_frame, write_delta
+from test.test_minimal_paths import random_network
+
+
+def expected_frame(cn):
+    participants = sorted(cn.participants())
+    rows = [(source, target, *distance) for source in participants for target, distance in single_source_all_distances(cn, source).items()]
+    result = pd.DataFrame(rows, columns=['source', 'target', 'shortest', 'fastest', 'foremost'])
+    category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
+    result.source = result.source.astype(category)
+    result.target = result.target.astype(category)
+    return result.set_index(['source', 'target']).sort_index()
+
+
+def write(cn, path, chunk_rows):
+    with ResultWriter(path, cn, chunk_rows=chunk_rows) as writer:
+        for source in reversed(sorted(cn.participants())):
+            writer.append(source, single_source_all_distances(cn, source))
+    return writer
+
+
+class ResultWriterTest(unittest.TestCase):
+    channels = {'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v1', 'v4', 'v5'], 'h5': ['v6']}
+    cn = CommunicationNetwork(channels, {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 3, 'h5': 1}).freeze()
+
+    def test_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = write(ResultWriterTest.cn, Path(tmp_dir) / 'test.chunks', chunk_rows=3)
+            chunks = list(read_chunks(Path(tmp_dir) / 'test.chunks'))
+            self.assertEqual(writer.num_chunks, len(chunks))
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(writer.num_rows, sum(len(chunk['target']) for chunk in chunks))
+            self.assertEqual(list(read_participants(Path(tmp_dir) / 'test.chunks')), ['v1', 'v2', 'v3', 'v4', 'v5', 'v6'])
+            for chunk in chunks:
+                self.assertEqual(chunk['source'].dtype, np.int32)
+                self.assertEqual(chunk['fastest'].dtype, np.int64)
+                # chunks hold complete sources
+                self.assertTrue(len(chunk['target']) <= 3 or len(np.unique(chunk['source'])) == 1)
+
+    def test_to_frame(self):
+        start = datetime(2023, 5, 26, 11, 8, 38, 766561)
+        for timings in ({'h1': 1, 'h2': 2, 'h3': 3, 'h4': 3, 'h5': 1},
+                        {'h1': start, 'h2': start + timedelta(hours=1), 'h3': start + timedelta(days=2), 'h4': start + timedelta(days=2), 'h5': start},
+                        {'h1': start.replace(tzinfo=timezone(timedelta(hours=2))), 'h2': start.replace(tzinfo=timezone(timedelta(hours=2))) + timedelta(seconds=1),
+                         'h3': start.replace(tzinfo=timezone(timedelta(hours=2))) + timedelta(days=1), 'h4': start.replace(tzinfo=timezone(timedelta(hours=2))) + timedelta(days=1),
+                         'h5': start.replace(tzinfo=timezone(timedelta(hours=2)))}):
+            cn = CommunicationNetwork(ResultWriterTest.channels, timings).freeze()
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                write(cn, Path(tmp_dir) / 'test.chunks', chunk_rows=4)
+                pd.testing.assert_frame_equal(to_frame(Path(tmp_dir) / 'test.chunks'), expected_frame(cn))
+
+    def test_to_frame_integers(self):
+        # hashed int64 participant IDs, like in the published data, keep their type and numeric order
+        names = {'v1': -1000302490388055954, 'v2': -1001028986621278490, 'v3': 2, 'v4': 999681621755937669, 'v5': 997201945995039833, 'v6': 10}
+        cn = CommunicationNetwork({channel: [names[participant] for participant in participants] for channel, participants in ResultWriterTest.channels.items()}, ResultWriterTest.cn.timings()).freeze()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write(cn, Path(tmp_dir) / 'test.chunks', chunk_rows=4)
+            self.assertEqual(list(read_participants(Path(tmp_dir) / 'test.chunks')), sorted(names.values()))
+            result = to_frame(Path(tmp_dir) / 'test.chunks')
+            pd.testing.assert_frame_equal(result, expected_frame(cn))
+            self.assertEqual(result.index.levels[0].categories.dtype, np.int64)
+
+    def test_resume(self):
+        cn = ResultWriterTest.cn
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'test.chunks'
+            with self.assertRaises(KeyboardInterrupt):
+                with ResultWriter(path, cn, chunk_rows=2) as writer:
+                    for source in ('v1', 'v6', 'v3'):
+                        writer.append(source, single_source_all_distances(cn, source))
+                    raise KeyboardInterrupt
+            (path / 'part-00002.partial').write_bytes(b'interrupted')
+            with ResultWriter(path, cn, chunk_rows=2, resume=True) as writer:
+                self.assertEqual(writer.completed, {'v1', 'v6', 'v3'})
+                for source in ('v2', 'v4', 'v5'):
+                    writer.append(source, single_source_all_distances(cn, source))
+            self.assertFalse((path / 'part-00002.partial').exists())
+            pd.testing.assert_frame_equal(to_frame(path), expected_frame(cn))
+            with ResultWriter(path, cn, resume=True) as writer:
+                self.assertEqual(writer.completed, set(cn.participants()))
+            pd.testing.assert_frame_equal(to_frame(path), expected_frame(cn))
+
+    def test_resume_metrics(self):
+        cn = ResultWriterTest.cn
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'test.chunks'
+            with self.assertRaises(KeyboardInterrupt):
+                with ResultWriter(path, cn, chunk_rows=100) as writer:
+                    writer.append('v1', single_source_all_distances(cn, 'v1'))
+                    writer.flush()
+                    writer.append('v2', single_source_all_distances(cn, 'v2'))
+                    append_metrics(path, [(source, 0.5, 1, 2, 2, 0, 1, 3, source) for source in ('v1', 'v2')])
+                    # killed before v2 is flushed
+                    writer._buffered_sources = []  # pylint: disable=protected-access
+                    raise KeyboardInterrupt
+            with ResultWriter(path, cn, resume=True) as writer:
+                self.assertEqual(writer.completed, {'v1'})
+            self.assertEqual(list(read_metrics(path).index), ['v1'])
+
+    def test_resume_other_network(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ResultWriter(Path(tmp_dir) / 'test.chunks', ResultWriterTest.cn).flush()
+            other = CommunicationNetwork(ResultWriterTest.channels, {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 1}).freeze()
+            with self.assertRaises(ValueError):
+                ResultWriter(Path(tmp_dir) / 'test.chunks', other, resume=True)
+
+    def test_epochs(self):
+        cn = random_network(4).freeze()
+        for source in sorted(cn.participants())[:5]:
+            distances, epoch_distances = single_source_all_distances(cn, source, latest_starts=True), single_source_all_distances(cn.as_epochs(), source, latest_starts=True)
+            self.assertEqual(distances, {target: (hop, cn.to_duration(fastest), cn.to_timing(foremost), cn.to_timing(start)) for target, (hop, fastest, foremost, start) in epoch_distances.items()})
+            np.testing.assert_array_equal(distance_array(distances), distance_array(epoch_distances))
+        self.assertEqual(distance_array({}).shape, (0, 4))
+
+    def test_merge(self):
+        cn = ResultWriterTest.cn
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i, sources in enumerate((('v1', 'v2'), ('v3', ), ('v4', 'v5', 'v6'))):
+                with ResultWriter(Path(tmp_dir) / f'test.shard-{i}.chunks', cn, chunk_rows=2) as writer:
+                    for source in sources:
+                        writer.append(source, single_source_all_distances(cn, source))
+                append_metrics(writer.path, [(source, 0.5, 1, 2, 2, 0, 1, 3, source) for source in sources])
+            merge_results([Path(tmp_dir) / f'test.shard-{i}.chunks' for i in range(3)], Path(tmp_dir) / 'test.chunks')
+            pd.testing.assert_frame_equal(to_frame(Path(tmp_dir) / 'test.chunks'), expected_frame(cn))
+            metrics = read_metrics(Path(tmp_dir) / 'test.chunks')
+            self.assertEqual(sorted(metrics.index), ['v1', 'v2', 'v3', 'v4', 'v5', 'v6'])
+            self.assertEqual(list(metrics.columns), ['seconds', 'reachable', 'pushes', 'pops', 'stale_pops', 'relaxations', 'scanned', 'representative'])
+            with self.assertRaises(ValueError):
+                merge_results([Path(tmp_dir) / f'test.shard-{i}.chunks' for i in range(2)], Path(tmp_dir) / 'test.chunks')
+            with self.assertRaises(ValueError):
+                merge_results([Path(tmp_dir) / f'test.shard-{i}.chunks' for i in (0, 1, 2, 1)], Path(tmp_dir) / 'test.chunks')
+            pd.testing.assert_frame_equal(to_frame(Path(tmp_dir) / 'test.chunks'), expected_frame(cn))
+
+    def test_delta(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': 1, 'h2': 2})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'test.chunks'
+            with ResultWriter(path, cn.freeze(), latest_starts=True) as writer:
+                for source in sorted(cn.participants()):
+                    writer.append(source, single_source_all_distances(cn, source, latest_starts=True))
+            previous = {source: single_source_all_distances(cn, source, latest_starts=True) for source in cn.participants()}
+            for channels, timings in (({'h3': ['v1', 'v3'], 'h4': ['v3', 'v4']}, {'h3': 3, 'h4': 4}), ({'h5': ['v5', 'v1']}, {'h5': 5})):
+                min_timing = min(timings.values())
+                cn.add_channels(channels, timings)
+                write_delta(path, cn.freeze(), update_all_distances(cn, previous, min_timing))
+                previous = {source: single_source_all_distances(cn, source, latest_starts=True) for source in cn.participants()}
+                pd.testing.assert_frame_equal(to_frame(path), expected_frame(cn))
+            participants, columns = read_columns(path, targets={'v1'})
+            self.assertEqual(list(participants), ['v1', 'v2', 'v3', 'v4', 'v5'])
+            self.assertEqual(sorted(participants[source] for source in columns['source']), ['v2', 'v3', 'v5'])
+            self.assertEqual(columns['latest_start'][list(columns['source']).index(1)], 2)
+
+    def test_incomplete(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = ResultWriter(Path(tmp_dir) / 'test.chunks', ResultWriterTest.cn)
+            writer.append('v1', single_source_all_distances(ResultWriterTest.cn, 'v1'))
+            writer.flush()
+            with self.assertRaises(FileNotFoundError):
+                to_frame(Path(tmp_dir) / 'test.chunks')
+
+
+
+class ReachabilityTest(unittest.TestCase):
+    def test_export_reachability(self):
+        cn = ResultWriterTest.cn
+        participants = sorted(cn.participants())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = export_reachability(tmp_dir, 'test', participants, all_pairs_reachability(cn, participants, block_size=8), matrix=True)
+            self.assertEqual(result.reachable.tolist(), [len(single_source_all_distances(cn, source)) for source in participants])
+            pd.testing.assert_frame_equal(pd.read_pickle(Path(tmp_dir) / 'test.reachability.pickle.bz2', compression='bz2'), result)
+            matrix = np.unpackbits(np.load(Path(tmp_dir) / 'test.reachability.npy'), axis=1, bitorder='little')[:, :len(participants)]
+            self.assertEqual({(participants[row], participants[column]) for row, column in zip(*np.nonzero(matrix))},
+                             {(source, target) for source in participants for target in single_source_all_distances(cn, source)})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,165 @@
+import tempfile
 import timeit
+from pathlib import Path
 import unittest
 from simulation.model import CommunicationNetwork
-from simulation.run import run_simulation, argparse
+from simulation.results import read_metrics, to_frame
+from datetime import datetime
+from simulation.run import (run_simulation, argparse, attach_networks, all_distances, class_distances, participant_classes, profiled, timed_all_distances, write_profile, _worker_profile,
+                            load_network, parse_shard, schedule, shard_participants, simulate, source_costs, window_bounds, to_epoch, BLOCK_SIZE)
 from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+import cProfile
 import pstats
+from test.test_minimal_paths import random_network
 
 
 class TestPerformance(unittest.TestCase):
     @unittest.skip("Performance test is skipped due to the long execution time")
     def test_performance_time(self):
         start_time = timeit.default_timer()
-        run_simulation()
+        with patch('sys.argv', ['run', '--profile', 'outputfile']):
+            run_simulation()
         end_time = timeit.default_timer()
         print(f"Execution time: {end_time - start_time} seconds")
         p = pstats.Stats('outputfile')
         p.sort_stats('cumulative').print_stats(20)
 
 
+class TestWorker(unittest.TestCase):
+    cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3}).freeze()
+
+    def test_all_distances(self):
+        attach_networks({'test': TestWorker.cn})
+        with tempfile.TemporaryDirectory() as tmp_dir, patch('simulation.run.NETWORK_DIR_PATH', Path(tmp_dir)):
+            for engine in ('hyperedge_dijkstra', 'vertex_dijkstra', 'bitset_bfs', 'successor_dag'):
+                self.assertEqual(all_distances('test', ('v1', 'v4'), engine), [('v1', {'v2': (1, 0, 1), 'v3': (2, 1, 2), 'v4': (3, 2, 3)}), ('v4', {'v3': (1, 0, 3)})])
+        self.assertEqual(all_distances('test', ('v1', 'v4'), 'single_traversal'), [('v1', {'v2': (1, 0, 1, 1), 'v3': (2, 1, 2, 1), 'v4': (3, 2, 3, 1)}), ('v4', {'v3': (1, 0, 3, 3)})])
+
+    def test_metrics(self):
+        attach_networks({'test': TestWorker.cn})
+        for engine in ('single_traversal', 'hyperedge_dijkstra', 'bitset_bfs'):
+            _, _, distances, metrics = timed_all_distances('test', ('v1', 'v4'), engine)
+            self.assertEqual([source for source, _ in distances], ['v1', 'v4'])
+            self.assertEqual([(source, reachable) for source, _, reachable, *_ in metrics], [('v1', 3), ('v4', 1)])
+            self.assertTrue(all(pushes > 0 and pops > 0 for _, _, _, pushes, pops, *_ in metrics))
+        self.assertEqual(metrics[0][3:], (3, 3, 0, 2, 2))
+
+    def test_profile(self):
+        attach_networks({'test': TestWorker.cn})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            attach_networks({}, tmp_dir)
+            try:
+                self.assertEqual(profiled(all_distances, 'test', ('v1', ), 'single_traversal'), all_distances('test', ('v1', ), 'single_traversal'))
+            finally:
+                _worker_profile.clear()
+            self.assertEqual(len(list(Path(tmp_dir).glob('worker-*.prof'))), 1)
+            parent = cProfile.Profile()
+            parent.runcall(sorted, TestWorker.cn.participants())
+            with patch('sys.stdout'):
+                write_profile(parent, tmp_dir, Path(tmp_dir) / 'merged.prof')
+            stats = pstats.Stats(str(Path(tmp_dir) / 'merged.prof'))
+            self.assertIn('all_distances', {function for _, _, function in stats.stats})
+
+    def test_pruned_classes(self):
+        # searching the representatives in the pruned network yields the distances of all participants; v0 has a
+        # twin, and lonely only takes part in a channel of its own, which is pruned
+        for seed in range(5):
+            network = random_network(seed, num_vertices=8, num_hedges=40)
+            channels = {channel: network.participants(channel) | ({'twin'} if 'v0' in network.participants(channel) else set()) for channel in network.channels()}
+            cn = CommunicationNetwork({**channels, 'alone': {'lonely'}}, {**network.timings(), 'alone': min(network.timings().values())}).freeze()
+            pruned, _ = cn.pruned()
+            participants = sorted(cn.participants())
+            classes = participant_classes(pruned, participants)
+            self.assertLess(len(classes), len(participants))
+            with tempfile.TemporaryDirectory() as tmp_dir, patch('simulation.run.NETWORK_DIR_PATH', Path(tmp_dir)):
+                for engine in ('single_traversal', 'hyperedge_dijkstra', 'vertex_dijkstra', 'bitset_bfs', 'successor_dag'):
+                    attach_networks({'test': cn})
+                    expected = dict(all_distances('test', participants, engine))
+                    self.assertEqual(expected['lonely'], {})
+                    attach_networks({'test': pruned})
+                    for source, distances in all_distances('test', tuple(classes), engine):
+                        for participant in classes[source]:
+                            self.assertEqual(class_distances(distances, source, participant), expected[participant])
+
+    def test_class_metrics(self):
+        # every participant of a class gets a metrics row with the counters of the search of its representative
+        cn = CommunicationNetwork({'h1': ['v1', 'v2', 'twin'], 'h2': ['v2', 'v3'], 'h3': ['v1', 'twin']}, {'h1': 1, 'h2': 2, 'h3': 3}).freeze()
+        pruned, _ = cn.pruned()
+        attach_networks({'test': pruned})
+        with tempfile.TemporaryDirectory() as tmp_dir, ThreadPoolExecutor(1) as executor, patch('sys.stdout'):
+            simulate(executor, 1, cn, 'test', sorted(cn.participants()), 'single_traversal', Path(tmp_dir) / 'test.chunks', search_network=pruned)
+            metrics = read_metrics(Path(tmp_dir) / 'test.chunks')
+            reachable = to_frame(Path(tmp_dir) / 'test.chunks').groupby(level=0, observed=False).size()
+        self.assertEqual(sorted(metrics.index), ['twin', 'v1', 'v2', 'v3'])
+        self.assertEqual(metrics.loc['v1', 'representative'], metrics.loc['twin', 'representative'])
+        self.assertEqual(metrics.loc['v1', 'pushes'], metrics.loc['twin', 'pushes'])
+        self.assertEqual(metrics.reachable.to_dict(), reachable.to_dict())
+
+    def test_load_network_integers(self):
+        # the published participants are hashed int64 IDs, which the columnar network keeps
+        cn = CommunicationNetwork({'h1': [-1000302490388055954, 2], 'h2': [2, 3], 'h3': [3, 999681621755937669]}, {'h1': datetime(2020, 1, 1), 'h2': datetime(2020, 1, 2), 'h3': datetime(2020, 1, 3)})
+        with tempfile.TemporaryDirectory() as tmp_dir, patch('simulation.run.NETWORK_DIR_PATH', Path(tmp_dir)):
+            cn.to_json(Path(tmp_dir) / 'test.json.bz2')
+            loaded = load_network('test')
+            self.assertEqual(sorted(loaded.participants()), sorted(cn.participants()))
+            participants = tuple(sorted(cn.participants()))
+            for engine in ('single_traversal', 'hyperedge_dijkstra'):
+                attach_networks({'test': cn.freeze()})
+                expected = all_distances('test', participants, engine)
+                attach_networks({'test': loaded})
+                self.assertEqual(all_distances('test', participants, engine), expected)
+
+
+class TestShards(unittest.TestCase):
+    cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v4', 'v5'], 'h5': ['v6', 'v7']}, {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 4}).freeze()
+
+    def test_source_costs(self):
+        self.assertEqual(source_costs(TestShards.cn), {'v1': 5, 'v2': 5, 'v3': 4, 'v4': 3, 'v5': 2, 'v6': 2, 'v7': 2})
+
+    def test_shard_participants(self):
+        for num_shards in (1, 2, 3, 10):
+            shards = shard_participants(TestShards.cn, num_shards)
+            self.assertEqual(len(shards), num_shards)
+            self.assertEqual(sorted(participant for shard in shards for participant in shard), sorted(TestShards.cn.participants()))
+            self.assertEqual(shards, shard_participants(TestShards.cn, num_shards))
+        self.assertEqual(shard_participants(TestShards.cn, 2), [('v1', 'v3', 'v6'), ('v2', 'v4', 'v5', 'v7')])
+
+    def test_schedule(self):
+        costs = {f'v{i}': cost for i, cost in enumerate([1000, 0, 3, 999, 2] + [1] * 600)}
+        tasks = schedule(costs, costs, 'single_traversal', 2)
+        self.assertEqual(sorted(source for task in tasks for source in task), sorted(costs))
+        self.assertEqual(tasks[:2], [('v0', ), ('v3', )])
+        self.assertEqual([costs[source] for task in tasks for source in task], sorted(costs.values(), reverse=True))
+        self.assertGreater(len(tasks[-1]), 1)
+        tasks = schedule(costs, costs, 'bitset_bfs', 2)
+        self.assertEqual([len(task) for task in tasks], [BLOCK_SIZE, BLOCK_SIZE, len(costs) - 2 * BLOCK_SIZE])
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('2/4'), (2, 4))
+        for value in ('4/4', '-1/4', '1', 'a/b'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(value)
+
+
+
+class TestWindows(unittest.TestCase):
+    def test_window_bounds(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 5, 'h3': 7}).freeze()
+        self.assertEqual(window_bounds(cn, 3, 4), {1: [5], 4: [8], 7: [11]})
+        self.assertEqual(window_bounds(cn, 3), {1: [4, 7, 10]})
+        # steps and sizes are parsed as floats, which must be whole for integer timings
+        self.assertEqual(window_bounds(cn, 3.0, 4.0), {1: [5], 4: [8], 7: [11]})
+        for step, size in ((1.5, None), (3, 0.5)):
+            with self.assertRaises(ValueError):
+                window_bounds(cn, step, size)
+        with self.assertRaises(ValueError):
+            window_bounds(cn, 0)
+
+    def test_window_bounds_datetimes(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': datetime(2020, 1, 1, 15), 'h2': datetime(2020, 1, 3, 9)}).freeze()
+        self.assertEqual(window_bounds(cn, 1, 2), {to_epoch(datetime(2020, 1, day)): [to_epoch(datetime(2020, 1, day + 2))] for day in (1, 2, 3)})
+
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
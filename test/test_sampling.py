@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from simulation.minimal_paths import single_source_all_distances
+from simulation.sampling import SampleEstimator, sample_sources
+from test.test_minimal_paths import random_network
+
+
+class SampleSourcesTest(unittest.TestCase):
+    cn = random_network(0, num_vertices=40).freeze()
+
+    def test_sample(self):
+        sample, stratum_sizes = sample_sources(SampleSourcesTest.cn, 10, seed=1)
+        self.assertEqual(sample, sample_sources(SampleSourcesTest.cn, 10, seed=1)[0])
+        self.assertNotEqual(sample, sample_sources(SampleSourcesTest.cn, 10, seed=2)[0])
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertEqual(stratum_sizes, [len(SampleSourcesTest.cn.participants())])
+
+    def test_stratified_sample(self):
+        cn = SampleSourcesTest.cn
+        sample, stratum_sizes = sample_sources(cn, 5, strata=4)
+        self.assertEqual(sum(stratum_sizes), len(cn.participants()))
+        self.assertEqual(sorted({stratum for _, stratum in sample}), [0, 1, 2, 3])
+        self.assertTrue(all(sum(stratum == i for _, stratum in sample) >= 2 for i in range(4)))
+        degrees = {stratum: [len(cn.channels(source)) for source, s in sample if s == stratum] for stratum in range(4)}
+        self.assertLessEqual(max(degrees[0]), min(degrees[3]))
+        with self.assertRaises(ValueError):
+            sample_sources(cn, 5, strata=0)
+
+
+class SampleEstimatorTest(unittest.TestCase):
+    def test_full_sample(self):
+        cn = random_network(2).freeze()
+        distances = {source: single_source_all_distances(cn, source) for source in cn.participants()}
+        estimator = SampleEstimator(cn, [len(distances)])
+        self.assertFalse(estimator.ready())
+        for source in sorted(distances):
+            estimator.add(0, distances[source])
+        estimates = estimator.estimates(quantiles=(0.5, ))
+        # with all sources, the estimates are exact and certain
+        self.assertTrue(np.allclose(estimates.half_width, 0))
+        self.assertEqual(estimates.loc[('reachable', 0.5), 'estimate'], int(np.quantile([len(targets) for targets in distances.values()], 0.5, method='inverted_cdf')))
+        self.assertEqual(estimates.loc[('shortest', 0.5), 'estimate'], int(np.quantile([distance[0] for targets in distances.values() for distance in targets.values()], 0.5, method='inverted_cdf')))
+        self.assertEqual(estimates.loc[('foremost', 0.5), 'lower'], estimates.loc[('foremost', 0.5), 'estimate'])
+
+    def test_partial_sample(self):
+        cn = random_network(3).freeze()
+        sample, stratum_sizes = sample_sources(cn, 12, strata=2)
+        estimator = SampleEstimator(cn, stratum_sizes)
+        for source, stratum in sample:
+            estimator.add(stratum, single_source_all_distances(cn, source))
+        estimates = estimator.estimates()
+        self.assertTrue((estimates.half_width > 0).any())
+        self.assertTrue(all(lower <= estimate <= upper for lower, estimate, upper in zip(estimates.lower, estimates.estimate, estimates.upper)))
+
+
+if __name__ == "__main__":
+    unittest.main()
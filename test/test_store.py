@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+import json
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+
+import pandas as pd
+
+from simulation.minimal_paths import single_source_all_distances, update_all_distances
+from simulation.model import CommunicationNetwork, EntityNotFound
+from simulation.results import ResultWriter, to_frame, write_delta
+from simulation.store import ResultStore, build_store, query_handler
+from test.test_minimal_paths import random_network
+from test.test_results import write
+
+
+class ResultStoreTest(unittest.TestCase):
+    def assert_store(self, path, store_path):
+        build_store(path, store_path)
+        store = ResultStore(store_path)
+        expected = to_frame(path)
+        for source in store.participants:
+            rows = expected.loc[source] if source in expected.index.get_level_values(0) else expected.iloc[:0].droplevel(0)
+            rows.index = rows.index.astype(object)
+            pd.testing.assert_frame_equal(store.neighborhood(source), rows, check_names=False)
+            for target in store.participants:
+                self.assertEqual(store.distance(source, target), tuple(rows.loc[target]) if target in rows.index else None)
+
+    def test_store(self):
+        for timezone_ in (None, timezone(timedelta(hours=2))):
+            cn = random_network(1, num_vertices=12, num_hedges=30)
+            cn = CommunicationNetwork({channel: cn.participants(channel) for channel in cn.channels()}, {channel: timing.replace(tzinfo=timezone_) for channel, timing in cn.timings().items()}).freeze()
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                write(cn, Path(tmp_dir) / 'test.chunks', chunk_rows=10)
+                self.assert_store(Path(tmp_dir) / 'test.chunks', Path(tmp_dir) / 'test.store')
+
+    def test_thresholds(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': datetime(2020, 1, 1), 'h2': datetime(2020, 1, 5), 'h3': datetime(2020, 1, 10)}).freeze()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write(cn, Path(tmp_dir) / 'test.chunks', chunk_rows=10)
+            build_store(Path(tmp_dir) / 'test.chunks', Path(tmp_dir) / 'test.store')
+            store = ResultStore(Path(tmp_dir) / 'test.store')
+            self.assertEqual(list(store.neighborhood('v1').index), ['v2', 'v3', 'v4'])
+            self.assertEqual(list(store.neighborhood('v1', fastest=timedelta(days=7)).index), ['v2', 'v3'])
+            self.assertEqual(list(store.neighborhood('v1', shortest=1).index), ['v2'])
+            self.assertEqual(list(store.neighborhood('v1', foremost=datetime(2020, 1, 9)).index), ['v2', 'v3'])
+            self.assertEqual(store.parse_thresholds({'fastest': '7 days', 'source': 'v1'}), {'fastest': pd.Timedelta(days=7)})
+            self.assertEqual(store.distance('v1', 'v3'), (2, pd.Timedelta(days=4), pd.Timestamp(2020, 1, 5)))
+            self.assertIsNone(store.distance('v4', 'v1'))
+            with self.assertRaises(EntityNotFound):
+                store.distance('v1', 'v5')
+
+    def test_integers(self):
+        cn = CommunicationNetwork({'h1': [-1000302490388055954, 2], 'h2': [2, 999681621755937669]}, {'h1': 1, 'h2': 2}).freeze()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write(cn, Path(tmp_dir) / 'test.chunks', chunk_rows=10)
+            self.assert_store(Path(tmp_dir) / 'test.chunks', Path(tmp_dir) / 'test.store')
+            store = ResultStore(Path(tmp_dir) / 'test.store')
+            self.assertEqual(store.distance(-1000302490388055954, 999681621755937669), (2, 1, 2))
+            self.assertEqual(list(store.neighborhood('2').index), [-1000302490388055954, 999681621755937669])
+
+    def test_deltas(self):
+        cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': 1, 'h2': 2})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'test.chunks'
+            with ResultWriter(path, cn.freeze(), latest_starts=True) as writer:
+                for source in sorted(cn.participants()):
+                    writer.append(source, single_source_all_distances(cn.freeze(), source, latest_starts=True))
+            previous = {source: single_source_all_distances(cn.freeze(), source, latest_starts=True) for source in cn.participants()}
+            cn.add_channels({'h3': ['v3', 'v4']}, {'h3': 3})
+            write_delta(path, cn.freeze(), update_all_distances(cn.freeze(), previous, 3))
+            self.assert_store(path, Path(tmp_dir) / 'test.store')
+            self.assertEqual(ResultStore(Path(tmp_dir) / 'test.store').distance('v1', 'v4'), (3, 2, 3))
+
+    def test_http(self):
+        cn = CommunicationNetwork({'h1': ['v 1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': datetime(2020, 1, 1), 'h2': datetime(2020, 1, 9)}).freeze()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write(cn, Path(tmp_dir) / 'test.chunks', chunk_rows=10)
+            build_store(Path(tmp_dir) / 'test.chunks', Path(tmp_dir) / 'test.store')
+            with ThreadingHTTPServer(('127.0.0.1', 0), query_handler({'test': ResultStore(Path(tmp_dir) / 'test.store')})) as server:
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                url = f'http://127.0.0.1:{server.server_address[1]}/test'
+                try:
+                    with urlopen(f'{url}/distance?source={quote("v 1")}&target=v3') as response:
+                        self.assertEqual(json.loads(response.read()), {'target': 'v3', 'shortest': 2, 'fastest': 'P8DT0H0M0S', 'foremost': '2020-01-09T00:00:00.000'})
+                    with urlopen(f'{url}/distance?source=v3&target={quote("v 1")}') as response:
+                        self.assertIsNone(json.loads(response.read()))
+                    with urlopen(f'{url}/neighborhood?source={quote("v 1")}&fastest={quote("7 days")}') as response:
+                        self.assertEqual([row['target'] for row in json.loads(response.read())], ['v2'])
+                    for query, status in (('neighborhood?source=v9', 404), ('neighborhood?source=v2&fastest=soon', 400), ('distance?source=v2', 400)):
+                        with self.assertRaises(HTTPError) as context:
+                            urlopen(f'{url}/{query}')  # pylint: disable=consider-using-with
+                        self.assertEqual(context.exception.code, status)
+                finally:
+                    server.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
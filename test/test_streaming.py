@@ -0,0 +1,71 @@
+import bz2
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from simulation.model import CommunicationNetwork
+from simulation.streaming import ChannelArrays, ChannelParser, bz2_segments, read_network
+from simulation.synthetic import synthetic_network
+
+
+def channels_of(cn):
+    return {channel: (frozenset(cn.participants(channel)), cn.timings(channel)) for channel in cn.channels()}
+
+
+class ChannelParserTest(unittest.TestCase):
+    document = {'c1': {'participants': ['a', 'b', 'a'], 'end': '2020-01-01T10:00:00'}, 'c "2"': {'participants': ['b', 'c}'], 'end': '2020-01-02T10:00:00'}, 'c3': {'participants': [], 'end': '2020-01-01T09:00:00'}}
+
+    def parse(self, data, block_size):
+        parser = ChannelParser(ChannelArrays())
+        for i in range(0, len(data), block_size):
+            parser.feed(data[i:i + block_size])
+        return parser.close()
+
+    def test_layouts(self):
+        for data in (json.dumps(self.document).encode('utf-8'), json.dumps(self.document, indent=2).encode('utf-8'), ('{\n' + ',\n'.join(f'{json.dumps(key)}: {json.dumps(value)}' for key, value in self.document.items()) + '\n}\n').encode('utf-8')):
+            for block_size in (1, 7, len(data)):
+                arrays = self.parse(data, block_size)
+                self.assertEqual(arrays.hedge_names, ['c1', 'c "2"', 'c3'])
+                self.assertEqual(list(arrays.vertex_index), ['a', 'b', 'c}'])
+                self.assertEqual(list(arrays.hedge_offsets), [0, 2, 4, 4])
+                self.assertEqual(list(arrays.hedge_vertices), [0, 1, 1, 2])
+
+    def test_invalid(self):
+        data = json.dumps(self.document).encode('utf-8')
+        for invalid in (data[:-1], data[:len(data) // 2], data + b'{}', b'[]', b'{"c1" {}}', b''):
+            with self.assertRaises(ValueError):
+                self.parse(invalid, 5)
+
+
+class ReadNetworkTest(unittest.TestCase):
+    def test_read_network(self):
+        cn = synthetic_network(2000, seed=3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for file_name in ('test.json', 'test.json.bz2'):
+                cn.to_json(Path(tmp_dir) / file_name)
+                frozen = read_network(Path(tmp_dir) / file_name, name='test', num_processes=1)
+                self.assertEqual(frozen.name, 'test')
+                self.assertEqual(channels_of(frozen), channels_of(CommunicationNetwork.from_json(Path(tmp_dir) / file_name)))
+            (Path(tmp_dir) / 'single.json.bz2').write_bytes(bz2.compress(json.dumps(json.loads((Path(tmp_dir) / 'test.json').read_bytes())).encode('utf-8')))
+            self.assertEqual(read_network(Path(tmp_dir) / 'single.json.bz2', num_processes=1).content_hash(), frozen.content_hash())
+
+    def test_parallel(self):
+        cn = synthetic_network(3000, seed=4)
+        with tempfile.TemporaryDirectory() as tmp_dir, patch('simulation.model.BZ2_STREAM_SIZE', 1 << 14), patch('simulation.streaming.MIN_SEGMENT_SIZE', 1 << 12):
+            cn.to_json(Path(tmp_dir) / 'test.json.bz2')
+            self.assertGreater(len(bz2_segments(Path(tmp_dir) / 'test.json.bz2', 8)), 2)
+            self.assertEqual(read_network(Path(tmp_dir) / 'test.json.bz2', num_processes=2).content_hash(), read_network(Path(tmp_dir) / 'test.json.bz2', num_processes=1).content_hash())
+
+    def test_truncated(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            synthetic_network(100).to_json(Path(tmp_dir) / 'test.json.bz2')
+            data = (Path(tmp_dir) / 'test.json.bz2').read_bytes()
+            (Path(tmp_dir) / 'test.json.bz2').write_bytes(data[:-10])
+            with self.assertRaises(EOFError):
+                read_network(Path(tmp_dir) / 'test.json.bz2', num_processes=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from simulation.model import CommunicationNetwork
+from simulation.synthetic import synthetic_network
+
+
+class SyntheticNetworkTest(unittest.TestCase):
+    def test_seeded(self):
+        cn = synthetic_network(500, seed=1)
+        self.assertEqual(cn.timings(), synthetic_network(500, seed=1).timings())
+        self.assertEqual({channel: cn.participants(channel) for channel in cn.channels()}, {channel: synthetic_network(500, seed=1).participants(channel) for channel in cn.channels()})
+        self.assertNotEqual(cn.timings(), synthetic_network(500, seed=2).timings())
+
+    def test_shape(self):
+        cn = synthetic_network(2000, seed=0, days=14)
+        self.assertEqual(len(cn.channels()), 2000)
+        self.assertLessEqual(len(cn.participants()), 250)
+        sizes = sorted(len(cn.participants(channel)) for channel in cn.channels())
+        self.assertLessEqual(sizes[len(sizes) // 2], 3)
+        self.assertGreater(sizes[-1], 10)
+        degrees = sorted(len(cn.channels(participant)) for participant in cn.participants())
+        self.assertGreater(degrees[-1], 5 * degrees[len(degrees) // 2])
+        timings = cn.timings().values()
+        self.assertTrue(all(datetime(2020, 1, 1) <= timing < datetime(2020, 1, 15) for timing in timings))
+        self.assertLess(sum(timing.weekday() >= 5 for timing in timings), len(timings) / 5)
+
+    def test_integer_timings(self):
+        cn = synthetic_network(100, seed=0, integer_timings=True)
+        self.assertTrue(all(0 <= timing < 28 * 24 * 3600 * 10 ** 6 for timing in cn.timings().values()))
+
+    def test_json(self):
+        cn = synthetic_network(100, seed=0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cn.to_json(Path(tmp_dir) / 'synthetic.json.bz2')
+            loaded = CommunicationNetwork.from_json(Path(tmp_dir) / 'synthetic.json.bz2')
+        self.assertEqual(loaded.timings(), cn.timings())
+        self.assertEqual(loaded.participants(), cn.participants())
+        self.assertEqual(loaded.participants('c7'), cn.participants('c7'))
+        self.assertLess(max(cn.timings().values()) - min(cn.timings().values()), timedelta(days=28))
+
+
+if __name__ == "__main__":
+    unittest.main()